@@ -0,0 +1,286 @@
+import math
+from gametype import GameType
+
+
+def permutation(alternatives, rank):
+    """The permutation of `alternatives` with the given rank, i.e. the
+    `rank`-th permutation in lexicographic order (the order in which
+    `itertools.permutations` produces them for a sorted list).
+    """
+
+    remaining = list(alternatives)
+    result = []
+
+    # Factorial number system: every digit picks one of the remaining items
+    for position in range(len(remaining) - 1, -1, -1):
+        digit, rank = divmod(rank, math.factorial(position))
+        result.append(remaining.pop(digit))
+
+    return result
+
+
+def rank(alternatives, permutation):
+    """The lexicographic rank of `permutation` among all permutations of
+    `alternatives`. This is the inverse of `permutation`.
+    """
+
+    remaining = list(alternatives)
+    result = 0
+
+    for position, alternative in enumerate(permutation):
+        digit = remaining.index(alternative)
+        result += digit * math.factorial(len(permutation) - position - 1)
+        remaining.pop(digit)
+
+    return result
+
+
+def permutations(alternatives, start, stop):
+    """Yields the permutations of `alternatives` with ranks `start` up to (but
+    not including) `stop`, in lexicographic order. Only the first one is
+    unranked; the rest are generated by stepping to the next permutation.
+    """
+
+    alternatives = list(alternatives)
+    stop = min(stop, math.factorial(len(alternatives)))
+
+    if start >= stop:
+        return
+
+    # Work on indices so we don't depend on how the alternatives compare
+    indices = permutation(range(len(alternatives)), start)
+    m = len(indices)
+
+    for _ in range(start, stop):
+        yield [alternatives[i] for i in indices]
+
+        # Standard next permutation algorithm: find the longest decreasing
+        # suffix, swap the item before it with the smallest larger item in the
+        # suffix and reverse the suffix
+        i = m - 2
+        while i >= 0 and indices[i] > indices[i + 1]:
+            i -= 1
+
+        if i < 0:
+            return
+
+        j = m - 1
+        while indices[j] < indices[i]:
+            j -= 1
+
+        indices[i], indices[j] = indices[j], indices[i]
+        indices[i + 1:] = reversed(indices[i + 1:])
+
+
+def walk(type, beats, visit=None):
+    """Calculates the outcome of every agenda, i.e. every permutation of the
+    alternatives, by walking the agendas back to front.
+
+    The outcome of an agenda only depends on its first item and the rest of
+    the agenda (its suffix), and many agendas share the same suffix. The
+    agendas are therefore enumerated depth first over a trie of suffixes: we
+    start with the last item, and every step prepends one more. Every node
+    keeps what is needed to derive the outcome of its children in constant
+    time per child, so all 𝑚! agendas take O(𝑚!) steps in total, instead of
+    O(𝑚!·𝑚) (or worse, for the amendment procedure) when every agenda is
+    evaluated on its own.
+
+    * Successive: o(x, R) = x if x beats o(R), else o(R), so a node only
+      needs the outcome of its suffix.
+    * Amendment: o(x1, x2, R) compares o(x1, R) and o(x2, R), where o(a, R)
+      itself compares o(a, R') and o(R[0], R') for R = (R[0], R'). A node for
+      suffix R keeps o(a, R) for every alternative a that is not in R; its
+      children derive their table from it in one step per entry.
+
+    Alternatives are referred to by their index in `beats`, which is the
+    thresholded pairwise relation of a profile (see `Profile.beats`): x beats
+    y if `beats[x][y]`, i.e. if enough voters prefer x over y to reach the
+    quota. Ties are broken like in `Game`.
+
+    Args:
+        type: The GameType.
+        beats: An 𝑚×𝑚 matrix of booleans.
+        visit: Optional function that is called as `visit(rank, agenda,
+            winner)` for every agenda, where `agenda` is a tuple of indices and
+            `rank` its lexicographic rank (see `rank`).
+
+    Returns:
+        The number of agendas every alternative wins, as a list indexed like
+        `beats`.
+    """
+
+    m = len(beats)
+    counts = [0] * m
+    factorials = [math.factorial(k) for k in range(m)]
+    # free[mask]: the alternatives that are not in the bit set `mask`
+    free = [[x for x in range(m) if not mask >> x & 1] for mask in range(1 << m)]
+
+    if m == 1:
+        counts[0] = 1
+        if visit != None:
+            visit(0, (0,), 0)
+        return counts
+
+    def successive(suffix, k, mask, outcome, rank):
+        # suffix: the last k items of the agenda (only kept if we need to
+        # visit), mask: the same items as a bit set, outcome: o(suffix)
+        for x in free[mask]:
+            bit = 1 << x
+            winner = x if beats[x][outcome] else outcome
+
+            if visit != None:
+                # Lehmer code: the number of smaller items after x
+                r = rank + bin(mask & (bit - 1)).count("1") * factorials[k]
+                agenda = (x,) + suffix
+            else:
+                r = agenda = None
+
+            if k + 1 == m:
+                counts[winner] += 1
+                if visit != None:
+                    visit(r, agenda, winner)
+            else:
+                successive(agenda, k + 1, mask | bit, winner, r)
+
+    def amendment(suffix, k, mask, table, rank):
+        # table[a] = o(a, suffix) for every a not in the suffix
+        for x in free[mask]:
+            bit = 1 << x
+            outcome_x = table[x]
+            extended = mask | bit
+
+            if visit != None:
+                r = rank + bin(mask & (bit - 1)).count("1") * factorials[k]
+                agenda = (x,) + suffix
+            else:
+                r = agenda = None
+
+            if k + 2 == m:
+                # Only one alternative is left, which goes in front
+                a = free[extended][0]
+                outcome_a = table[a]
+                winner = outcome_a if beats[outcome_a][outcome_x] else outcome_x
+
+                counts[winner] += 1
+                if visit != None:
+                    visit(r + bin(extended & ((1 << a) - 1)).count("1") * factorials[m - 1],
+                          (a,) + agenda, winner)
+            else:
+                child = [0] * m
+                for a in free[extended]:
+                    outcome_a = table[a]
+                    child[a] = outcome_a if beats[outcome_a][outcome_x] else outcome_x
+
+                amendment(agenda, k + 1, extended, child, r)
+
+    if type == GameType.AMENDMENT:
+        amendment((), 0, 0, list(range(m)), 0)
+    else:
+        for x in range(m):
+            successive((x,), 1, 1 << x, x, 0)
+
+    return counts
+
+
+def walk_many(type, relations, last=None):
+    """Like `walk`, but for several relations (e.g. the relations of
+    different profiles over the same alternatives) at once: every agenda is
+    enumerated once and evaluated against all of them, with the per-relation
+    state of a node kept side by side.
+
+    Args:
+        type: The GameType.
+        relations: A list of 𝑚×𝑚 matrices of booleans, see `walk`.
+        last: Optionally, only enumerate the agendas ending in this
+            alternative. This splits the work into 𝑚 independent parts.
+
+    Returns:
+        A matrix with, for every relation, the number of agendas every
+        alternative wins.
+    """
+
+    m = len(relations[0])
+    counts = [[0] * m for _ in relations]
+    free = [[x for x in range(m) if not mask >> x & 1] for mask in range(1 << m)]
+    # rows[x]: row x of every relation
+    rows = [[relation[x] for relation in relations] for x in range(m)]
+
+    def count(winners):
+        for row, winner in zip(counts, winners):
+            row[winner] += 1
+
+    if m == 1:
+        count([0] * len(relations))
+        return counts
+
+    def successive(k, mask, outcomes):
+        # outcomes: o(suffix) for every relation
+        for x in free[mask]:
+            winners = [x if row[outcome] else outcome for row, outcome in zip(rows[x], outcomes)]
+
+            if k + 1 == m:
+                count(winners)
+            else:
+                successive(k + 1, mask | 1 << x, winners)
+
+    def amendment(k, mask, tables):
+        # tables[i][a] = o(a, suffix) for relation i
+        for x in free[mask]:
+            extended = mask | 1 << x
+
+            if k + 2 == m:
+                a = free[extended][0]
+                count([table[a] if relation[table[a]][table[x]] else table[x]
+                       for relation, table in zip(relations, tables)])
+            else:
+                children = []
+                for relation, table in zip(relations, tables):
+                    outcome_x = table[x]
+                    child = [0] * m
+                    for a in free[extended]:
+                        outcome_a = table[a]
+                        child[a] = outcome_a if relation[outcome_a][outcome_x] else outcome_x
+                    children.append(child)
+
+                amendment(k + 1, extended, children)
+
+    lasts = range(m) if last == None else [last]
+
+    for x in lasts:
+        if type == GameType.AMENDMENT:
+            # o(a, (x)) for every a
+            tables = [[a if relation[a][x] else x for a in range(m)] for relation in relations]
+            if m == 2:
+                count([table[1 - x] for table in tables])
+            else:
+                amendment(1, 1 << x, tables)
+        else:
+            successive(1, 1 << x, [x] * len(relations))
+
+    return counts
+
+
+def evaluate(type, beats, agenda):
+    """The winner of a single agenda, given as a list of indices into
+    `beats` (see `walk`). Takes O(𝑚) steps for the successive procedure and
+    O(𝑚²) for the amendment procedure, by working back to front like `walk`.
+    """
+
+    if type == GameType.AMENDMENT:
+        # table[a] = o(a, suffix), starting with an empty suffix
+        table = {a: a for a in agenda}
+
+        for i in range(len(agenda) - 1, 0, -1):
+            outcome_x = table[agenda[i]]
+            for a in agenda[:i]:
+                outcome_a = table[a]
+                table[a] = outcome_a if beats[outcome_a][outcome_x] else outcome_x
+
+        return table[agenda[0]]
+    else:
+        outcome = agenda[-1]
+
+        for x in reversed(agenda[:-1]):
+            outcome = x if beats[x][outcome] else outcome
+
+        return outcome
@@ -2,6 +2,8 @@ import itertools
 import math
 import concurrent.futures
 import random
+import agenda
+import outcome_table
 from gametype import GameType
 from profile import Profile
 from game import Game
@@ -9,26 +11,44 @@ from multiprocessing import Manager
 
 
 class Analysis:
-    def __init__(self, type, profile, quota, expected_outcome=None):
+    # Up to this number of alternatives, all agendas are tested. For more
+    # alternatives, a random sample is used.
+    MAX_EXHAUSTIVE = 7
+
+    def __init__(self, type, profile, quota, expected_outcome=None, cache=None, coordinator=None,
+                 table_path=None):
         self.type = type
         self.profile = profile
         self.quota = quota
         self.expected_outcome = expected_outcome
+        # An optional OutcomeCache. If given, outcome distributions are looked
+        # up in the cache before calculating them, and saved there afterwards.
+        self.cache = cache
+        # An optional shard.Coordinator. If given, all agendas are enumerated
+        # exactly (regardless of the number of alternatives) by the workers
+        # connected to it, instead of by a local process pool.
+        self.coordinator = coordinator
+        # An optional path. If given, the winner of every agenda is written to
+        # an outcome table there (see outcome_table.py). This always tests all
+        # agendas, on this machine.
+        self.table_path = table_path
+        # The number of agendas the last call to `histogram` looked at
+        self.num_agendas = 0
 
-    def outcomes(self):
-        """The possible outcomes for the current configuration.
+    def agendas(self):
+        """The agendas to test for the current configuration.
 
-        Currently just loops over all permutations of the agenda, calculates the
-        outcome and adds the result to the set of outcomes. This is not very
-        efficient, so keep that in mind for larger agendas/profiles!
+        Returns:
+            A tuple `(descriptor, permutations)`. The descriptor identifies the
+            set of agendas for caching purposes: it is None if the agendas were
+            sampled at random, since those results can't be reused.
         """
 
-        outcomes = dict.fromkeys(self.profile.alternatives, 0)
         m = len(self.profile.alternatives)
         n = len(self.profile.ballots)
         permutations = []
 
-        if m > 7:
+        if m > self.MAX_EXHAUSTIVE:
             # minimum between n^2 and 7!
             # based on doi:10/gdtm7r, section 6.3
             total = min(n**2, 5040)
@@ -37,14 +57,78 @@ class Analysis:
                 while new_perm in permutations:
                     new_perm = list(random.sample(list(self.profile.alternatives), m))
                 permutations.append(new_perm)
+
+            return None, permutations
         else:
             permutations = list(itertools.permutations(self.profile.alternatives))
-            total = math.factorial(len(self.profile.alternatives))
+
+            return "permutations", permutations
+
+    def histogram(self):
+        """The number of tested agendas for which every alternative wins.
+
+        Uses the cache if one was given and the agendas are not random.
+        """
+
+        m = len(self.profile.alternatives)
+
+        if self.table_path != None or self.coordinator != None or m <= self.MAX_EXHAUSTIVE:
+            # All permutations are tested, so we don't need to list them: the
+            # workers or `agenda.walk` enumerate them themselves
+            descriptor = "permutations"
+            total = math.factorial(m)
+        else:
+            descriptor, permutations = self.agendas()
+            total = len(permutations)
+
+        self.num_agendas = total
+
+        if self.table_path != None:
+            print(f"Testing {total} agendas and writing their outcomes to {self.table_path}...")
+            outcomes = outcome_table.write(self.table_path, self.type, self.profile, self.quota)
+
+            if self.cache != None:
+                self.cache.put(self.cache.key(self.profile, self.type, self.quota, descriptor), outcomes)
+
+            return outcomes
+
+        key = None
+        if self.cache != None and descriptor != None:
+            key = self.cache.key(self.profile, self.type, self.quota, descriptor)
+            cached = self.cache.get(key)
+
+            if cached != None:
+                print(f"Using cached outcomes of {total} agendas...")
+                return cached
+
+        if self.coordinator != None:
+            print(f"Testing {total} agendas on the connected workers...")
+            outcomes = self.coordinator.histogram(self.type, self.profile, self.quota)
+
+            if key != None:
+                self.cache.put(key, outcomes)
+
+            return outcomes
 
         print(f"Testing {total} agendas...")
 
+        if descriptor == "permutations":
+            # Walk over all agendas, reusing the outcomes of shared suffixes
+            counts = agenda.walk(self.type, self.profile.beats(self.quota))
+            outcomes = dict(zip(sorted(self.profile.alternatives), counts))
+
+            if key != None:
+                self.cache.put(key, outcomes)
+
+            return outcomes
+
+        outcomes = dict.fromkeys(self.profile.alternatives, 0)
         outcomes_temp = []
 
+        # Calculate the pairwise matrix up front, so it is sent to the worker
+        # processes instead of being recalculated by every one of them
+        self.profile.pairwise()
+
         with concurrent.futures.ProcessPoolExecutor(max_workers=6) as executor:
             for permutation in permutations:
                 outcomes_temp.append(
@@ -55,6 +139,27 @@ class Analysis:
             result = outcome.result()
             outcomes[result] = outcomes.get(result, 0) + 1
 
+        if key != None:
+            self.cache.put(key, outcomes)
+
+        return outcomes
+
+    def outcomes(self):
+        """The possible outcomes for the current configuration.
+
+        Currently just loops over all permutations of the agenda, calculates the
+        outcome and adds the result to the set of outcomes. This is not very
+        efficient, so keep that in mind for larger agendas/profiles!
+        """
+
+        return self.summary(self.histogram())
+
+    def summary(self, outcomes):
+        """Summarises an outcome histogram as returned by `histogram` (or
+        `batch_histograms`): how often the expected outcome won, as a
+        percentage, and the sorted names of all possible winners.
+        """
+
         nonzero_outcomes = list(filter(lambda x: x[1] > 0, outcomes.items()))
 
         outcome = sorted(
@@ -72,6 +177,91 @@ class Analysis:
 
         return percentage, outcome
 
+def batch_histograms(type, profiles, quotas, cache=None, max_workers=6):
+    """The outcome histograms of several profiles over the same alternatives,
+    e.g. a batch of random profiles, for the same set of agendas.
+
+    Instead of analysing every profile on its own, the relations of all
+    profiles for their quotas are stacked and every agenda is evaluated
+    against all of them in one pass: `agenda.walk_many` if all agendas are
+    tested, split over processes by the last item of the agenda, or
+    `agenda.evaluate` on a single random sample of agendas otherwise (based on
+    the first profile, like `Analysis.agendas`).
+
+    If a cache is given, profiles whose outcomes are cached are left out of
+    the batch, and the outcomes of the others are saved. Like in `Analysis`,
+    outcomes of random samples are not cached.
+
+    Returns:
+        A matrix with a row per profile and a column per alternative (in
+        sorted order), containing the number of agendas each alternative wins.
+    """
+
+    alternatives = sorted(profiles[0].alternatives)
+    m = len(alternatives)
+
+    for profile in profiles:
+        if sorted(profile.alternatives) != alternatives:
+            raise ValueError("All profiles in a batch need to have the same alternatives.")
+
+    counts = [None] * len(profiles)
+
+    if m <= Analysis.MAX_EXHAUSTIVE:
+        keys = [None] * len(profiles)
+
+        if cache != None:
+            for i, (profile, quota) in enumerate(zip(profiles, quotas)):
+                keys[i] = cache.key(profile, type, quota, "permutations")
+                cached = cache.get(keys[i])
+
+                if cached != None:
+                    counts[i] = [cached.get(x, 0) for x in alternatives]
+
+            if any(row != None for row in counts):
+                print(f"Using cached outcomes for {sum(row != None for row in counts)} profiles...")
+
+        missing = [i for i, row in enumerate(counts) if row == None]
+
+        if len(missing) == 0:
+            return counts
+
+        print(f"Testing {math.factorial(m)} agendas on {len(missing)} profiles...")
+
+        relations = [profiles[i].beats(quotas[i]) for i in missing]
+
+        for i in missing:
+            counts[i] = [0] * m
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parts = [executor.submit(agenda.walk_many, type, relations, last) for last in range(m)]
+
+            for part in parts:
+                for i, part_row in zip(missing, part.result()):
+                    for index, count in enumerate(part_row):
+                        counts[i][index] += count
+
+        if cache != None:
+            for i in missing:
+                cache.put(keys[i], dict(zip(alternatives, counts[i])))
+
+        return counts
+
+    relations = [profile.beats(quota) for profile, quota in zip(profiles, quotas)]
+
+    _, permutations = Analysis(type, profiles[0], quotas[0]).agendas()
+    index = {x: i for i, x in enumerate(alternatives)}
+    permutations = [[index[x] for x in permutation] for permutation in permutations]
+
+    print(f"Testing {len(permutations)} agendas on {len(profiles)} profiles...")
+
+    for i, relation in enumerate(relations):
+        counts[i] = [0] * m
+        for permutation in permutations:
+            counts[i][agenda.evaluate(type, relation, permutation)] += 1
+
+    return counts
+
+
 def calculate_outcome(type, permutation, quota, profile):
     game = Game(type, list(permutation), quota, profile)
     return game.outcome()
@@ -1,5 +1,44 @@
 class Ballot:
-    def __init__(self, id, preference = [], weight = 1) -> None:
+    def __init__(self, id, preference = [], weight = 1, groups = None) -> None:
         self.id = id
+        # The ranked alternatives, most preferred first. For incomplete orders
+        # this only contains the ranked prefix; unranked alternatives are
+        # considered to be tied below all ranked ones.
         self.preference = preference
-        self.weight = weight
\ No newline at end of file
+        self.weight = weight
+        # For orders with ties: the sizes of the indifference classes in
+        # `preference`, e.g. [1, 2, 1] for a > b ~ c > d. None for strict
+        # orders.
+        self.groups = groups
+
+    def tiers(self):
+        """The ranked alternatives grouped into indifference classes, most
+        preferred class first.
+        """
+
+        if self.groups == None:
+            return [[alternative] for alternative in self.preference]
+
+        tiers = []
+        start = 0
+        for size in self.groups:
+            tiers.append(self.preference[start:start + size])
+            start += size
+
+        return tiers
+
+    def rank(self, alternative):
+        """The index of the indifference class `alternative` is in, or None if
+        it is not ranked on this ballot.
+        """
+
+        if self.groups == None:
+            if alternative in self.preference:
+                return self.preference.index(alternative)
+            return None
+
+        for index, tier in enumerate(self.tiers()):
+            if alternative in tier:
+                return index
+
+        return None
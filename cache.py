@@ -0,0 +1,100 @@
+import json
+import os
+import sqlite3
+import time
+
+
+class OutcomeCache:
+    """A small on-disk cache for the outcome distributions computed by
+    `Analysis`, so rerunning an experiment on the same profiles doesn't have to
+    enumerate all agendas again.
+
+    Entries map a key built from the profile contents, the game type, the quota
+    and the set of agendas that was tested to the number of times every
+    alternative won. The cache is stored in a single SQLite file and holds at
+    most `max_entries` entries; when it is full, the least recently used
+    entries are evicted.
+    """
+
+    DEFAULT_PATH = "./.outcome-cache.sqlite"
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                "key TEXT PRIMARY KEY, histogram TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS outcomes_last_used ON outcomes (last_used)"
+            )
+
+
+    @staticmethod
+    def key(profile, type, quota, agendas) -> str:
+        """The cache key for analysing `profile` with game type `type` and
+        quota `quota` on the agendas described by `agendas`.
+        """
+
+        # 25 and 25.0 are the same quota
+        return f"{profile.digest()}:{type}:{float(quota)!r}:{agendas}"
+
+
+    def get(self, key):
+        """The cached outcome histogram for `key`, or None if it is not in the
+        cache.
+        """
+
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT histogram FROM outcomes WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row == None:
+                return None
+
+            self.connection.execute(
+                "UPDATE outcomes SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+
+        return json.loads(row[0])
+
+
+    def put(self, key, histogram):
+        """Store an outcome histogram, evicting the least recently used entries
+        if the cache grows beyond `max_entries`.
+        """
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO outcomes (key, histogram, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(histogram), time.time()),
+            )
+            self.connection.execute(
+                "DELETE FROM outcomes WHERE key NOT IN "
+                "(SELECT key FROM outcomes ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+
+    def clear(self):
+        """Remove all entries from the cache.
+        """
+
+        with self.connection:
+            self.connection.execute("DELETE FROM outcomes")
+
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM outcomes").fetchone()[0]
+
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,524 @@
+import argparse
+import itertools
+import random
+import os
+import sys
+import tempfile
+import threading
+import time
+import agenda
+import outcome_table
+import shard
+from analysis import Analysis
+from ballot import Ballot
+from fractions import Fraction
+from game import Game
+from gametype import GameType
+from profile import Profile
+from rule import Rule
+
+
+# Differential testing of the faster ways of evaluating games against the
+# reference recursion in `Game`. Random profiles, quotas and agendas are
+# generated from a seed, every engine is compared with the reference and
+# failing cases are shrunk to a minimal counterexample.
+#
+# Engines come in two kinds:
+#
+# * agenda engines take (type, profile, quota, agenda) and return the winner
+#   of that single agenda;
+# * histogram engines take (type, profile, quota) and return the number of
+#   times every alternative wins over all permutations of the alternatives.
+
+
+def reference_winner(type, profile, quota, agenda):
+    return Game(type, list(agenda), quota, profile).outcome()
+
+
+def reference_histogram(type, profile, quota):
+    counts = dict.fromkeys(profile.alternatives, 0)
+
+    for permutation in itertools.permutations(sorted(profile.alternatives)):
+        counts[reference_winner(type, profile, quota, permutation)] += 1
+
+    return counts
+
+
+def rank_range_winner(type, profile, quota, agenda_):
+    """A single agenda through `shard.evaluate_range`, which also exercises
+    the permutation (un)ranking.
+    """
+    r = agenda.rank(sorted(profile.alternatives), agenda_)
+    counts = shard.evaluate_range(type, profile, quota, r, r + 1)
+    return next(x for x, count in counts.items() if count > 0)
+
+
+def range_histogram(type, profile, quota):
+    # Uneven ranges, so the ranges have to be stitched together correctly
+    total = len(list(itertools.permutations(profile.alternatives)))
+    counts = dict.fromkeys(profile.alternatives, 0)
+
+    for start in range(0, total, 7):
+        for x, count in shard.evaluate_range(type, profile, quota, start, start + 7).items():
+            counts[x] += count
+
+    return counts
+
+
+def batch_histogram(type, profile, quota):
+    """Evaluates the profile in a batch with the same profile at other
+    quotas, one part (agendas ending in the same alternative) at a time, and
+    checks those against `agenda.walk` too.
+    """
+    alternatives = sorted(profile.alternatives)
+    quotas = [quota, quota / 2, quota + 1]
+    relations = [profile.beats(q) for q in quotas]
+    counts = [[0] * len(alternatives) for _ in relations]
+
+    for last in range(len(alternatives)):
+        for row, part_row in zip(counts, agenda.walk_many(type, relations, last)):
+            for index, count in enumerate(part_row):
+                row[index] += count
+
+    for row, relation in zip(counts[1:], relations[1:]):
+        if row != agenda.walk(type, relation):
+            return None
+
+    return dict(zip(alternatives, counts[0]))
+
+
+def walk_histogram(type, profile, quota):
+    alternatives = sorted(profile.alternatives)
+    return dict(zip(alternatives, agenda.walk(type, profile.beats(quota))))
+
+
+walk_tables = {}
+
+
+def walk_winner(type, profile, quota, agenda_):
+    """Looks a single agenda up in the table of all outcomes produced by
+    `agenda.walk`, which also checks the ranks it reports.
+    """
+    alternatives = sorted(profile.alternatives)
+    # Not id(profile): the short-lived profiles made while shrinking can reuse
+    # ids
+    key = (profile.digest(), type, quota)
+
+    if key not in walk_tables:
+        walk_tables.clear()
+        table = walk_tables[key] = {}
+
+        def visit(rank, indices, winner):
+            table[rank] = ([alternatives[i] for i in indices], alternatives[winner])
+
+        agenda.walk(type, profile.beats(quota), visit)
+
+    visited, winner = walk_tables[key][agenda.rank(alternatives, agenda_)]
+
+    return winner if visited == list(agenda_) else None
+
+
+def table_histogram(type, profile, quota):
+    """Writes an outcome table and reads the counts back from it.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "fuzz.outcomes")
+        written = outcome_table.write(path, type, profile, quota)
+
+        with outcome_table.OutcomeTable(path) as table:
+            counts = table.counts()
+
+    return counts if counts == written else None
+
+
+def analysis_histogram(type, profile, quota):
+    return Analysis(type, profile, quota).histogram()
+
+
+coordinator = None
+
+
+def coordinator_histogram(type, profile, quota):
+    """A coordinator on localhost with two worker threads, shared by all
+    cases.
+    """
+    global coordinator
+
+    if coordinator == None:
+        coordinator = shard.Coordinator(chunk_size=11)
+        for _ in range(2):
+            threading.Thread(target=shard.run_worker, args=coordinator.address, daemon=True).start()
+
+    return coordinator.histogram(type, profile, quota)
+
+
+AGENDA_ENGINES = {
+    "rank-range": rank_range_winner,
+    "walk": walk_winner,
+}
+
+HISTOGRAM_ENGINES = {
+    "range": range_histogram,
+    "walk": walk_histogram,
+    "batch": batch_histogram,
+    "table": table_histogram,
+    "analysis": analysis_histogram,
+    "coordinator": coordinator_histogram,
+}
+
+
+# Reference implementations of the rules. They take a profile and a scoring
+# vector (only used by the positional rule) and return the set of acceptable
+# winners, so rules that break ties arbitrarily can be checked too.
+
+def scores_winners(scores, alphabetic=False):
+    """The alternatives with the highest score. The references keep their
+    scores exact (integers or `Fraction`s), so ties are exact as well. If
+    `alphabetic` is set, only the alphabetically first of the tied
+    alternatives is accepted.
+    """
+    best = max(scores.values())
+    winners = {x for x, score in scores.items() if score == best}
+
+    if alphabetic:
+        return {min(winners, key=str)}
+
+    return winners
+
+
+def reference_plurality(profile, scoring):
+    scores = dict.fromkeys(profile.alternatives, 0)
+    for ballot in profile.ballots.values():
+        # alternatives tied at the top share the weight
+        top = [x for x in ballot.preference if ballot.rank(x) == 0]
+        for x in top:
+            scores[x] += Fraction(ballot.weight, len(top))
+
+    return scores_winners(scores, alphabetic=True)
+
+
+def reference_borda(profile, scoring):
+    # number of alternatives ranked below, i.e. m - position - 1 for complete
+    # strict orders
+    scores = dict.fromkeys(profile.alternatives, 0)
+    for ballot in profile.ballots.values():
+        for x in profile.alternatives:
+            for y in profile.alternatives:
+                if profile.prefers(ballot.id, x, y):
+                    scores[x] += ballot.weight
+
+    return scores_winners(scores)
+
+
+def reference_positional_scores(profile, scoring):
+    scoring = list(scoring) + [0] * (len(profile.alternatives) - len(scoring))
+    scores = dict.fromkeys(profile.alternatives, 0)
+
+    for ballot in profile.ballots.values():
+        position = 0
+        for tier in ballot.tiers():
+            # tied alternatives get the average score of their positions
+            average = Fraction(sum(scoring[position:position + len(tier)]), len(tier))
+            for x in tier:
+                scores[x] += ballot.weight * average
+            position += len(tier)
+
+    return scores
+
+
+def reference_positional(profile, scoring):
+    return scores_winners(reference_positional_scores(profile, scoring), alphabetic=True)
+
+
+def reference_copeland(profile, scoring):
+    pairwise = reference_pairwise(profile)
+    alternatives = sorted(profile.alternatives)
+    scores = {x: sum((pairwise[i][j] > pairwise[j][i]) - (pairwise[i][j] < pairwise[j][i])
+                     for j in range(len(alternatives)))
+              for i, x in enumerate(alternatives)}
+
+    return scores_winners(scores, alphabetic=True)
+
+
+def reference_maximin(profile, scoring):
+    pairwise = reference_pairwise(profile)
+    alternatives = sorted(profile.alternatives)
+    scores = {x: min(pairwise[i][j] for j in range(len(alternatives)) if j != i)
+              for i, x in enumerate(alternatives)}
+
+    return scores_winners(scores, alphabetic=True)
+
+
+def reference_kemeny(profile, scoring):
+    """Tries all rankings.
+    """
+    pairwise = reference_pairwise(profile)
+    alternatives = sorted(profile.alternatives)
+    scores = {}
+
+    for ranking in itertools.permutations(range(len(alternatives))):
+        agreement = sum(pairwise[a][b] for i, a in enumerate(ranking) for b in ranking[i + 1:])
+        top = alternatives[ranking[0]]
+        scores[top] = max(scores.get(top, agreement), agreement)
+
+    return scores_winners(scores, alphabetic=True)
+
+
+def reference_pairwise(profile):
+    """The pairwise matrix, counted voter by voter.
+    """
+    alternatives = sorted(profile.alternatives)
+
+    return [[sum(ballot.weight for ballot in profile.ballots.values() if profile.prefers(ballot.id, x, y))
+             for y in alternatives] for x in alternatives]
+
+
+RULE_REFERENCES = {
+    Rule.PLURALITY: reference_plurality,
+    Rule.BORDA: reference_borda,
+    Rule.POSITIONAL: reference_positional,
+    Rule.COPELAND: reference_copeland,
+    Rule.MAXIMIN: reference_maximin,
+    Rule.KEMENY: reference_kemeny,
+}
+
+
+def random_profile(rng, m, n, max_weight, partial=0.0):
+    """A random profile. With probability `partial`, a ballot is truncated,
+    with twice that probability it contains ties, and with probability
+    `partial` it repeats the previous ballot as a separate ballot. Repeated
+    tied ballots add up fractional shares (e.g. thirds of a weight), which
+    is where exact ties are easy to miss.
+    """
+    alternatives = [chr(c) for c in range(ord('a'), ord('a') + m)]
+    ballots = []
+
+    for voter in range(1, n + 1):
+        if len(ballots) > 0 and rng.random() < partial:
+            ballots.append(dict(ballots[-1], id=voter))
+            continue
+
+        preference = rng.sample(alternatives, m)
+        ballot = {"id": voter, "weight": rng.randint(1, max_weight), "preference": preference}
+
+        if rng.random() < partial:
+            ballot["preference"] = preference[:rng.randint(1, m)]
+
+        if rng.random() < 2 * partial:
+            groups = []
+            remaining = len(ballot["preference"])
+            while remaining > 0:
+                groups.append(rng.randint(1, remaining))
+                remaining -= groups[-1]
+            ballot["groups"] = groups
+
+        ballots.append(ballot)
+
+    profile = {"alternatives": alternatives, "ballots": ballots,
+               "complete": all(len(b["preference"]) == m for b in ballots)}
+
+    return Profile.from_dict(profile)
+
+
+def random_quota(rng, profile):
+    """A quota, with extra probability on the edge cases.
+    """
+    total = sum(ballot.weight for ballot in profile.ballots.values())
+
+    return rng.choice([0, total / 2, total // 2, total // 2 + 1, total, total + 1,
+                       rng.randint(0, total), rng.uniform(0, total)])
+
+
+def profile_without(profile, voter=None, alternative=None, lighter=None):
+    """A copy of `profile` with a voter or alternative removed, or with the
+    weight of a voter lowered by one.
+    """
+    data = profile.to_dict(dominance=False)
+
+    if voter != None:
+        data["ballots"] = [b for b in data["ballots"] if b["id"] != voter]
+    if lighter != None:
+        for b in data["ballots"]:
+            if b["id"] == lighter:
+                b["weight"] -= 1
+    if alternative != None:
+        data["alternatives"] = [x for x in data["alternatives"] if x != alternative]
+        for b in data["ballots"]:
+            if alternative in b["preference"] and "groups" in b:
+                # shrink the group the alternative was in
+                tier = Ballot(None, b["preference"], groups=b["groups"]).rank(alternative)
+                b["groups"][tier] -= 1
+                b["groups"] = [size for size in b["groups"] if size > 0]
+            b["preference"] = [x for x in b["preference"] if x != alternative]
+        data["ballots"] = [b for b in data["ballots"] if len(b["preference"]) > 0]
+
+    return Profile.from_dict(data)
+
+
+def shrink(case, fails):
+    """Greedily makes a failing case smaller until no single step (removing a
+    voter, lowering a weight, removing an alternative) keeps it failing.
+    """
+    profile, quota, agenda_ = case
+
+    while True:
+        candidates = []
+
+        if len(profile.ballots) > 1:
+            candidates += [(profile_without(profile, voter=v), quota, agenda_) for v in profile.ballots]
+        candidates += [(profile_without(profile, lighter=v), quota, agenda_)
+                       for v, ballot in profile.ballots.items() if ballot.weight > 1]
+        if len(profile.alternatives) > 2:
+            candidates += [(profile_without(profile, alternative=x), quota,
+                            [y for y in agenda_ if y != x]) for x in sorted(profile.alternatives)]
+
+        for candidate in candidates:
+            if fails(*candidate):
+                profile, quota, agenda_ = candidate
+                break
+        else:
+            return profile, quota, agenda_
+
+
+def report(name, type, profile, quota, agenda_, expected, got):
+    print(f"\nMISMATCH in {name} ({type}, quota {quota}" + (f", agenda {agenda_}" if agenda_ != None else "") + ")")
+    print(f"\texpected {expected}, got {got}")
+    profile.print()
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    engines = set(args.engines) if args.engines != None else set(AGENDA_ENGINES) | set(HISTOGRAM_ENGINES)
+
+    # engine name -> [seconds in the engine, seconds in the reference on the same inputs]
+    times = {}
+    failures = 0
+
+    def timed(name, index, f, *arguments):
+        start = time.perf_counter()
+        result = f(*arguments)
+        times.setdefault(name, [0.0, 0.0])[index] += time.perf_counter() - start
+        return result
+
+    for case in range(args.cases):
+        m = rng.randint(2, args.max_alternatives)
+        n = rng.randint(1, args.max_voters)
+        profile = random_profile(rng, m, n, args.max_weight, args.partial)
+        quota = random_quota(rng, profile)
+        type = rng.choice(list(GameType))
+
+        # The pairwise matrix all engines are based on
+        got = timed("pairwise", 0, profile.pairwise)
+        expected = timed("pairwise", 1, reference_pairwise, profile)
+
+        if got != expected:
+            failures += 1
+            fails = lambda p, q, a: p.pairwise() != reference_pairwise(p)
+            p, _, _ = shrink((profile, quota, []), fails)
+            report("pairwise", type, p, quota, None, reference_pairwise(p), p.pairwise())
+
+        # Single agendas
+        for name, engine in AGENDA_ENGINES.items():
+            if name not in engines:
+                continue
+
+            for _ in range(args.agendas):
+                agenda_ = rng.sample(sorted(profile.alternatives), m)
+                expected = timed(name, 1, reference_winner, type, profile, quota, agenda_)
+                got = timed(name, 0, engine, type, profile, quota, agenda_)
+
+                if got != expected:
+                    failures += 1
+                    fails = lambda p, q, a: engine(type, p, q, a) != reference_winner(type, p, q, a)
+                    p, q, a = shrink((profile, quota, agenda_), fails)
+                    report(name, type, p, q, a, reference_winner(type, p, q, a), engine(type, p, q, a))
+
+        # Full outcome distributions
+        for name, engine in HISTOGRAM_ENGINES.items():
+            if name not in engines:
+                continue
+
+            expected = timed(name, 1, reference_histogram, type, profile, quota)
+            got = timed(name, 0, engine, type, profile, quota)
+
+            if got != expected:
+                failures += 1
+                fails = lambda p, q, a: engine(type, p, q) != reference_histogram(type, p, q)
+                p, q, _ = shrink((profile, quota, []), fails)
+                report(name, type, p, q, None, reference_histogram(type, p, q), engine(type, p, q))
+
+        # Rules
+        scoring = [rng.randint(0, 3) for _ in range(rng.randint(1, m))]
+
+        for rule, reference in RULE_REFERENCES.items():
+            got = timed(f"winner:{rule}", 0, profile.winner, rule, scoring)
+            expected = timed(f"winner:{rule}", 1, reference, profile, scoring)
+
+            if got not in expected:
+                failures += 1
+                fails = lambda p, q, a: p.winner(rule, scoring[:len(p.alternatives)]) not in reference(p, scoring[:len(p.alternatives)])
+                p, _, _ = shrink((profile, quota, []), fails)
+                # The other rules still get the full vector
+                shrunk_scoring = scoring[:len(p.alternatives)]
+                print(f"\nMISMATCH in winner({rule}, {shrunk_scoring}): expected one of "
+                      f"{sorted(reference(p, shrunk_scoring))}, got {p.winner(rule, shrunk_scoring)}")
+                p.print()
+
+        # Several scoring vectors in one pass
+        vectors = [[rng.randint(0, 3) for _ in range(rng.randint(1, m))] for _ in range(3)]
+        got = timed("positional-batch", 0, profile.positional_scores, vectors)
+        expected = timed("positional-batch", 1, lambda: [reference_positional_scores(profile, v) for v in vectors])
+
+        if any(abs(a[x] - b[x]) > 1e-9 for a, b in zip(got, expected) for x in a):
+            failures += 1
+            print(f"\nMISMATCH in positional_scores({vectors}): expected {expected}, got {got}")
+            profile.print()
+
+        # Quotas with the same relation
+        quotas = list(range(profile.num_voters() + 2))
+        classes = timed("quota-classes", 0, profile.quota_classes, quotas)
+        relations = timed("quota-classes", 1, lambda: [profile.beats(q) for q in quotas])
+        first = [relations[quota_class[0]] for quota_class in classes]
+
+        if (sorted(q for quota_class in classes for q in quota_class) != quotas
+                or any(relations[q] != relations[quota_class[0]] for quota_class in classes for q in quota_class)
+                or any(first.count(relation) > 1 for relation in first)):
+            failures += 1
+            print(f"\nMISMATCH in quota_classes({quotas}): got {classes}")
+            profile.print()
+
+    if coordinator != None:
+        coordinator.close()
+
+    print(f"\n{args.cases} cases, {failures} mismatches (seed {args.seed})\n")
+    print("Time spent per engine, the reference on the same inputs and their ratio:")
+    for name, (seconds, reference_seconds) in sorted(times.items()):
+        print(f"\t{name:20} {seconds:8.3f}s {reference_seconds:8.3f}s {seconds / max(reference_seconds, 1e-9):8.3f}")
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare the game engines and rules against the reference implementations on random profiles",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("-c", "--cases", type=int, default=100, help="Number of random profiles to test")
+    parser.add_argument("-a", "--agendas", type=int, default=10, help="Number of random agendas per profile for the agenda engines")
+    parser.add_argument("-m", "--max_alternatives", type=int, default=5, help="Maximum number of alternatives")
+    parser.add_argument("-n", "--max_voters", type=int, default=10, help="Maximum number of unique ballots")
+    parser.add_argument("-w", "--max_weight", type=int, default=3, help="Maximum weight of a ballot")
+    parser.add_argument("-p", "--partial", type=float, default=0.2, help="Probability of a ballot being incomplete or a repeat of the previous one. Ties are twice as likely")
+    parser.add_argument(
+        "-e",
+        "--engines",
+        nargs="+",
+        default=None,
+        choices=sorted(set(AGENDA_ENGINES) | set(HISTOGRAM_ENGINES)),
+        help="Which engines to test (default: all)",
+    )
+
+    args = parser.parse_args()
+
+    sys.exit(1 if main(args) > 0 else 0)
@@ -3,10 +3,16 @@ import random
 import os
 import math
 import argparse
+import time
+import threading
+from queue import Queue, Full
 from profile import Profile
 from game import Game
 from gametype import GameType
-from analysis import Analysis
+from analysis import Analysis, batch_histograms
+from cache import OutcomeCache
+from store import ResultsStore
+from shard import Coordinator, parse_address
 from rule import Rule
 from enum import Enum
 from pathlib import Path
@@ -14,33 +20,80 @@ from pathlib import Path
 
 def main(args):
 
-    if args.random_profile:
-        # Generate 5 random profiles of the give size. Filename is replaced with text 'generated'
-        profiles = {f"generated-{i}":Profile.random(num_voters=50, num_alternatives=args.n_alternatives) for i in range(25)}
-    else:
-        profiles = read_profiles(args.input_directory, args.n_alternatives)
+    if args.clear_cache:
+        OutcomeCache(args.cache_path).clear()
+
+    cache = OutcomeCache(args.cache_path) if args.cache else None
+
+    coordinator = None
+    if args.coordinator != None:
+        coordinator = Coordinator(*args.coordinator, timeout=args.worker_timeout)
+        host, port = coordinator.address
+        print(f"Waiting for workers on {host}:{port} (start them with `python shard.py {host}:{port}`)")
 
     if args.random_profile:
+        # Generate 25 random profiles of the give size. Filename is replaced with text 'generated'
+        profiles = {f"generated-{i}":Profile.random(num_voters=50, num_alternatives=args.n_alternatives) for i in range(25)}
         print(f"Generated {len(profiles)} random profiles with {args.n_alternatives} alternatives")
+        profiles = list(profiles.items())
     else:
-        if len(profiles) > 0:
-            print(f"Found {len(profiles)} profiles with {args.n_alternatives} alternatives")
+        paths = find_profiles(args.input_directory, args.n_alternatives)
+
+        if len(paths) > 0:
+            print(f"Found {len(paths)} profiles with {args.n_alternatives} alternatives")
         else:
             print(f"No profiles with {args.n_alternatives} alternatives found. Exiting.")
             exit()
 
+        # Parse the next profiles in the background while the current one is
+        # being analysed
+        profiles = stream_profiles(paths, args.queue_depth)
+
     results = {}
+    rows = []
+
+    if args.random_profile and coordinator == None and args.table_directory == None:
+        # The random profiles all have the same alternatives, so they can all
+        # be evaluated in a single pass over the agendas
+        quotas = [len(profile.ballots) / 2 for _, profile in profiles]
+
+        start = time.perf_counter()
+        counts = batch_histograms(args.procedure, [profile for _, profile in profiles], quotas, cache)
+        seconds = (time.perf_counter() - start) / len(quotas)
+
+        for (filename, profile), quota, row in zip(profiles, quotas, counts):
+            winner = profile.winner(args.rule, args.scoring)
+            analysis = Analysis(args.procedure, profile, quota, winner)
+            percentage, outcome = analysis.summary(dict(zip(sorted(profile.alternatives), row)))
+
+            results[filename] = percentage
+            rows.append(ResultsStore.row("analysis", filename, args.random_profile, args.rule, args.scoring,
+                                         args.procedure, args.n_alternatives, quota, percentage, outcome,
+                                         sum(row), seconds))
+    else:
+        for filename, profile in profiles:
+            winner = profile.winner(args.rule, args.scoring)
+            n = len(profile.ballots)
+            quota = n / 2
 
-    for filename, profile in profiles.items():
-        winner = profile.winner(args.rule)
-        n = len(profile.ballots)
-        quota = n / 2
+            table_path = None
+            if args.table_directory != None:
+                os.makedirs(args.table_directory, exist_ok=True)
+                table_path = os.path.join(args.table_directory, f"{filename}-{args.procedure}-q{quota}.outcomes")
 
-        analysis = Analysis(args.procedure, profile, quota, winner)
+            analysis = Analysis(args.procedure, profile, quota, winner, cache, coordinator, table_path)
 
-        percentage, _ = analysis.outcomes()
+            start = time.perf_counter()
+            percentage, outcome = analysis.outcomes()
+            seconds = time.perf_counter() - start
 
-        results[filename] = percentage
+            results[filename] = percentage
+            rows.append(ResultsStore.row("analysis", filename, args.random_profile, args.rule, args.scoring,
+                                         args.procedure, args.n_alternatives, quota, percentage, outcome,
+                                         analysis.num_agendas, seconds))
+
+    if coordinator != None:
+        coordinator.close()
 
     if len(results) > 0:
         avg = sum(results.values()) / len(results)
@@ -51,6 +104,11 @@ def main(args):
 
     os.makedirs(args.output_directory, exist_ok=True)
 
+    store = ResultsStore(args.results_store or os.path.join(args.output_directory, ResultsStore.DEFAULT_NAME))
+    store.replace("analysis", args.rule, args.scoring, args.procedure, args.n_alternatives,
+                  args.random_profile, rows)
+    store.close()
+
     if args.random_profile:
         is_random = "-random"
     else:
@@ -69,23 +127,79 @@ def main(args):
             writer.writerow([filename, percentage])
 
 
-def read_profiles(dir, alternatives):
-    profiles = {}
-
-    for file in os.scandir(dir):
-        if file.path.endswith(".soc"):
-            in_range = False
+def find_profiles(dir, alternatives):
+    """Finds the PrefLib files (`.soc`, `.soi` or `.toc`) in a directory with a given number of
+    alternatives. Only the first line of every file is read, the profiles
+    themselves are loaded by `stream_profiles` or `read_profiles`.
+    """
+    paths = []
 
+    for file in sorted(os.scandir(dir), key=lambda f: f.name):
+        if file.path.endswith((".soc", ".soi", ".toc")):
             with open(file) as cur_file:
                 num_alternatives = int(cur_file.readline())
                 if num_alternatives == alternatives:
-                    in_range = True
+                    paths.append(file.path)
+
+    return paths
+
+
+def read_profiles(dir, alternatives):
+    """Loads all profiles with a given number of alternatives at once.
+    """
+    return dict(stream_profiles(find_profiles(dir, alternatives)))
+
+
+def stream_profiles(paths, depth=2):
+    """Loads profiles on a background thread and yields `(name, profile)`
+    pairs as they become available.
+
+    The loader thread and the consumer are connected through a bounded queue,
+    so parsing the next files overlaps with analysing the current profile,
+    while at most `depth` parsed profiles are waiting in memory at any time.
+    """
+
+    queue = Queue(maxsize=max(depth, 1))
+    # Marks the end of the stream
+    done = object()
+    # Set by the consumer if it stops early, so the loader doesn't block on a
+    # full queue forever
+    stop = threading.Event()
+
+    def put(item):
+        # put with a timeout so we keep checking whether the consumer went away
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
 
-            if in_range:
-                profile = Profile.from_soc(file.path)
-                profiles[Path(file.name).stem] = profile
+    def load():
+        try:
+            for path in paths:
+                if stop.is_set():
+                    return
+                put((Path(path).stem, Profile.from_file(path)))
+        except Exception as e:
+            # Hand the error to the consumer, who re-raises it
+            put(e)
+            return
+        put(done)
 
-    return profiles
+    loader = threading.Thread(target=load, daemon=True)
+    loader.start()
+
+    try:
+        while True:
+            item = queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
 
 
 if __name__ == "__main__":
@@ -110,13 +224,21 @@ if __name__ == "__main__":
         type=Rule.argparse,
         default="plurality",
         choices=list(Rule),
-        help="Which rule to compare to. Note that only plurality and borda are implemented currently.",
+        help="Which rule to compare to. Note that condorcet and weak_condorcet are not implemented currently.",
+    )
+    parser.add_argument(
+        "-s",
+        "--scoring",
+        type=float,
+        nargs="+",
+        default=None,
+        help="The scoring vector for the positional rule, e.g. -s 2 1 0. Missing positions score 0",
     )
     parser.add_argument(
         "-i",
         "--input_directory",
         type=str,
-        help="An input directory containing .soc files",
+        help="An input directory containing .soc, .soi or .toc files",
     )
     parser.add_argument(
         "-o",
@@ -125,6 +247,56 @@ if __name__ == "__main__":
         default="./logs/",
         help="The directory to save output files to. Will be created if it doesn't exist already",
     )
+    parser.add_argument(
+        "-d",
+        "--queue_depth",
+        type=int,
+        default=2,
+        help="How many profiles to load ahead of the analysis. Higher values use more memory",
+    )
+    parser.add_argument(
+        "--results_store",
+        type=str,
+        default=None,
+        help="The database to save results to (default: results.sqlite in the output directory). See store.py",
+    )
+    parser.add_argument(
+        "-t",
+        "--table_directory",
+        type=str,
+        default=None,
+        help="If given, write the winner of every agenda to an outcome table in this directory (see outcome_table.py). All agendas are tested, regardless of the number of alternatives",
+    )
+    parser.add_argument(
+        "--cache",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+        help="Whether to reuse outcomes calculated in earlier runs, and save new ones",
+    )
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        default=OutcomeCache.DEFAULT_PATH,
+        help="The file to keep cached outcomes in",
+    )
+    parser.add_argument(
+        "--clear_cache",
+        default=False,
+        action="store_true",
+        help="Remove all cached outcomes before starting",
+    )
+    parser.add_argument(
+        "--coordinator",
+        type=parse_address,
+        default=None,
+        help="Enumerate all agendas exactly on workers connecting to this address (host:port), see shard.py",
+    )
+    parser.add_argument(
+        "--worker_timeout",
+        type=float,
+        default=Coordinator.DEFAULT_TIMEOUT,
+        help="How many seconds a worker gets per range before the range is handed to another worker",
+    )
     parser.add_argument(
         "-x",
         "--random_profile",
@@ -135,4 +307,7 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    if args.rule == Rule.POSITIONAL and args.scoring == None:
+        parser.error("the positional rule needs a scoring vector (--scoring)")
+
     main(args)
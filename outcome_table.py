@@ -0,0 +1,132 @@
+import json
+import math
+import mmap
+import struct
+import agenda
+from gametype import GameType
+
+
+# File layout: the magic bytes, the length of the metadata, the metadata as
+# JSON, padding up to a multiple of 8 bytes and then one byte per agenda, in
+# order of lexicographic rank (see `agenda.rank`). Every byte is the index of
+# the winner in the sorted list of alternatives.
+MAGIC = b"OUTCOMES"
+HEADER = struct.Struct("<8sI")
+
+# How many agendas to look at at once when scanning the table
+CHUNK_SIZE = 1 << 22
+
+
+def write(path, type, profile, quota):
+    """Calculates the winner of every agenda and writes them to a table at
+    `path`. The table is filled through a memory map, so it never has to fit
+    in memory.
+
+    Returns:
+        The number of agendas every alternative wins, like `Analysis.histogram`.
+    """
+
+    alternatives = sorted(profile.alternatives)
+    m = len(alternatives)
+
+    if m > 255:
+        raise ValueError("Outcome tables support at most 255 alternatives.")
+
+    metadata = json.dumps({
+        "alternatives": alternatives,
+        "type": str(type),
+        "quota": quota,
+        "profile": profile.digest(),
+    }).encode("utf-8")
+
+    offset = HEADER.size + len(metadata)
+    offset += -offset % 8
+    size = offset + math.factorial(m)
+
+    with open(path, "w+b") as table_file:
+        table_file.write(HEADER.pack(MAGIC, len(metadata)) + metadata)
+        table_file.truncate(size)
+        table_file.flush()
+
+        with mmap.mmap(table_file.fileno(), size) as table:
+            def visit(rank, _, winner):
+                table[offset + rank] = winner
+
+            counts = agenda.walk(type, profile.beats(quota), visit)
+            table.flush()
+
+    return dict(zip(alternatives, counts))
+
+
+class OutcomeTable:
+    """Read access to a table written by `write`. The table is memory-mapped,
+    so only the parts that are looked at are loaded.
+
+    Example:
+
+    ```
+    with OutcomeTable("profile.outcomes") as table:
+        table.counts()               # how often every alternative wins
+        table.winner(["a", "b", "c"])
+        next(table.agendas("b"))     # the first agenda for which b wins
+    ```
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.table = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, length = HEADER.unpack_from(self.table)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an outcome table.")
+
+        metadata = json.loads(self.table[HEADER.size:HEADER.size + length])
+        self.alternatives = metadata["alternatives"]
+        self.type = GameType.argparse(metadata["type"])
+        self.quota = metadata["quota"]
+        self.profile_digest = metadata["profile"]
+
+        self.offset = HEADER.size + length
+        self.offset += -self.offset % 8
+
+    def __len__(self):
+        return len(self.table) - self.offset
+
+    def winner(self, agenda_):
+        """The winner of an agenda.
+        """
+        return self.alternatives[self.table[self.offset + agenda.rank(self.alternatives, agenda_)]]
+
+    def counts(self):
+        """The number of agendas every alternative wins. Scans the table in
+        chunks.
+        """
+        counts = [0] * len(self.alternatives)
+
+        for start in range(self.offset, len(self.table), CHUNK_SIZE):
+            chunk = self.table[start:start + CHUNK_SIZE]
+            for index in range(len(counts)):
+                counts[index] += chunk.count(index)
+
+        return dict(zip(self.alternatives, counts))
+
+    def agendas(self, winner):
+        """Yields all agendas for which `winner` wins, in lexicographic order.
+        """
+        index = self.alternatives.index(winner)
+        position = self.table.find(bytes([index]), self.offset)
+
+        while position != -1:
+            yield agenda.permutation(self.alternatives, position - self.offset)
+            position = self.table.find(bytes([index]), position + 1)
+
+    def close(self):
+        self.table.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -1,6 +1,12 @@
+import bisect
 import csv
+import hashlib
+import json
 import profile
 import random
+import re
+import sys
+from fractions import Fraction
 from rule import Rule
 from ballot import Ballot
 from typing import Set
@@ -19,6 +25,12 @@ class Profile:
         # Optionally save names of alternatives
         self.alternatives_names = alternatives_names
 
+        # The pairwise comparison matrix, calculated on first use. See
+        # `pairwise`.
+        self.__pairwise = None
+        self.__index = None
+        self.__positions = None
+
 
     @classmethod
     def from_csv(cls, path: str) -> 'Profile':
@@ -110,12 +122,63 @@ class Profile:
         """Imports a `.soc` file from PrefLib representing a complete strict order
         """
 
+        return cls.__from_preflib(path, ties=False, complete=True)
+
+
+    @classmethod
+    def from_soi(cls, path: str) -> 'Profile':
+        """Imports a `.soi` file from PrefLib representing strict orders that
+        may be incomplete. Alternatives that are not on a ballot are considered
+        to be less preferred than all alternatives on it, and tied among each
+        other.
+        """
+
+        return cls.__from_preflib(path, ties=False, complete=False)
+
+
+    @classmethod
+    def from_toc(cls, path: str) -> 'Profile':
+        """Imports a `.toc` file from PrefLib representing complete orders
+        with ties, e.g. `12,1,{2,3},4`.
+        """
+
+        return cls.__from_preflib(path, ties=True, complete=True)
+
+
+    @classmethod
+    def from_file(cls, path: str) -> 'Profile':
+        """Imports a profile from any of the supported file types, based on
+        the extension of `path`.
+        """
+
+        readers = {
+            ".csv": cls.from_csv,
+            ".txt": cls.from_txt,
+            ".soc": cls.from_soc,
+            ".soi": cls.from_soi,
+            ".toc": cls.from_toc,
+        }
+
+        for extension, reader in readers.items():
+            if path.endswith(extension):
+                return reader(path)
+
+        raise ValueError(f"I don't know how to read {path}, expected one of {', '.join(readers)}.")
+
+
+    @classmethod
+    def __from_preflib(cls, path: str, ties: bool, complete: bool) -> 'Profile':
+        """Reads the PrefLib election data formats. The header is the same for
+        all of them; ballots are stored as their ranked alternatives plus the
+        sizes of the groups of tied alternatives, if there are any.
+        """
+
         ballots = {}
         alternatives = set()
         alternative_names = {}
 
-        with open(path) as socfile:
-            reader = socfile.readlines()
+        with open(path) as preflibfile:
+            reader = preflibfile.readlines()
 
             cur_line = 0
 
@@ -124,7 +187,7 @@ class Profile:
             cur_line += 1
 
             for alternative in range(cur_line, cur_line + num_alternatives):
-                alternative_line = reader[alternative].split(",")
+                alternative_line = reader[alternative].split(",", 1)
                 alternative_id = alternative_line[0].strip()
                 alternative_name = alternative_line[1].strip()
 
@@ -144,12 +207,44 @@ class Profile:
                 ballot_line = reader[ballot].split(",", maxsplit=1)
                 ballot_id = ballot - cur_line + 1
                 ballot_weight = int(ballot_line[0])
-                ballot_preference = ballot_line[1].strip().split(",")
-                ballot = Ballot(id=ballot_id, preference=ballot_preference, weight=ballot_weight)
-                ballots[ballot_id] = ballot
+
+                # Either a single alternative or a group of tied ones in braces
+                tiers = []
+                for item in re.findall(r"\{[^}]*\}|[^,{}\s]+", ballot_line[1]):
+                    tier = [x.strip() for x in item.strip("{}").split(",") if x.strip() != ""]
+                    if len(tier) > 0:
+                        tiers.append(tier)
+
+                ballot_groups = None
+                if any(len(tier) > 1 for tier in tiers):
+                    if not ties:
+                        raise ValueError(f"\n\tBallot {ballot_id} contains tied alternatives, "
+                                         f"which are not allowed in {path}.")
+                    ballot_groups = [len(tier) for tier in tiers]
+
+                ballot_preference = [x for tier in tiers for x in tier]
+                ballots[ballot_id] = Ballot(id=ballot_id, preference=ballot_preference,
+                                            weight=ballot_weight, groups=ballot_groups)
 
         new_profile = cls(ballots, alternatives, alternative_names)
-        new_profile.__validate()
+        new_profile.__validate(complete)
+
+        return new_profile
+
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Profile':
+        """Converts the output of `to_dict` back into a Profile object.
+        """
+
+        ballots = {}
+
+        for ballot in data["ballots"]:
+            ballots[ballot["id"]] = Ballot(id=ballot["id"], preference=list(ballot["preference"]),
+                                           weight=ballot["weight"], groups=ballot.get("groups"))
+
+        new_profile = cls(ballots, set(data["alternatives"]), data.get("names"))
+        new_profile.__validate(data.get("complete", True))
 
         return new_profile
 
@@ -191,11 +286,40 @@ class Profile:
             return name
 
 
-    def __validate(self):
+    def is_complete(self) -> bool:
+        """Whether every ballot ranks all alternatives.
+        """
+
+        m = len(self.alternatives)
+
+        return all(len(ballot.preference) == m for ballot in self.ballots.values())
+
+
+    def digest(self) -> str:
+        """A hash of the contents of the profile, i.e. the alternatives and
+        the weighted preferences. Voter ids and the order of the ballots are
+        ignored, and identical preferences are merged, so two profiles that
+        describe the same election have the same digest.
+        """
+
+        weights = {}
+        for ballot in self.ballots.values():
+            preference = tuple(tuple(sorted(tier)) for tier in ballot.tiers())
+            weights[preference] = weights.get(preference, 0) + ballot.weight
+
+        contents = json.dumps([self.__sorted_alternatives(), sorted(weights.items())])
+
+        return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+
+    def __validate(self, complete = True):
         """Validates the profile by:
 
         * Checking the length of all ballots is the same
         * Checking if the set of alternatives is the same for all ballots
+
+        If `complete` is False, ballots only have to rank a subset of the
+        alternatives, without ranking any alternative twice.
         """
 
         # Retrieve the first ballot and take the alternatives in there as the
@@ -208,6 +332,17 @@ class Profile:
         # iterate over voter preferences
         # (self.ballots.values() is a list of lists of alternatives)
         for voter, ballot in self.ballots.items():
+            if not complete:
+                unknown = set(ballot.preference).difference(self.alternatives)
+
+                if len(unknown) != 0:
+                    raise ValueError(f"\n\tVoter {voter} ranks alternatives that are not "
+                                     f"in the profile: {unknown}.")
+                if len(set(ballot.preference)) != len(ballot.preference):
+                    raise ValueError(f"\n\tVoter {voter} ranks some alternatives more than once.")
+
+                continue
+
             # if a ballot has a different number of alternatives than are
             # available, or if it contains alternatives not in the set of
             # alternatives, throw an error
@@ -254,21 +389,112 @@ class Profile:
 
         ballot = self.ballot(id)
 
-        # lower index means higher ranking
-        return ballot.preference.index(a1) < ballot.preference.index(a2)
+        # lower rank means more preferred; unranked alternatives are below all
+        # ranked ones
+        rank_1 = ballot.rank(a1)
+        rank_2 = ballot.rank(a2)
+
+        return rank_1 != None and (rank_2 == None or rank_1 < rank_2)
 
 
     def num_prefers(self, a1, a2):
         """The number of agents that prefer alternative `a1` over `a2`.
 
+        Looked up in the pairwise matrix, so this is a constant time operation
+        once the matrix has been calculated.
         """
-        num = 0
+
+        self.pairwise()
+
+        return self.__pairwise[self.__index[a1]][self.__index[a2]]
+
+
+    def pairwise(self):
+        """The pairwise comparison matrix: entry [i][j] is the (weighted)
+        number of voters that prefer the i-th alternative over the j-th one,
+        with the alternatives in sorted order. Calculated once and cached.
+
+        Ballots are not expanded into all 𝑚² comparisons. An alternative in
+        the k-th indifference class of a ballot beats every alternative except
+        the ones in the first k classes, so we add the ballot's weight to a
+        per-alternative "beats everything" counter and only subtract it again
+        for those classes. For a ballot ranking r alternatives this takes
+        O(r²) instead of O(𝑚²) steps, which is what makes short (incomplete)
+        ballots cheap.
+        """
+
+        if self.__pairwise != None:
+            return self.__pairwise
+
+        sorted_alternatives = self.__sorted_alternatives()
+        index = {x: i for i, x in enumerate(sorted_alternatives)}
+        m = len(sorted_alternatives)
+
+        beats_all = [0] * m
+        corrections = [[0] * m for _ in range(m)]
 
         for ballot in self.ballots.values():
-            if self.prefers(ballot.id, a1, a2):
-                num += ballot.weight
+            w = ballot.weight
+            # indices of the alternatives in the classes seen so far
+            above = []
+
+            for tier in ballot.tiers():
+                tier = [index[x] for x in tier]
+                above.extend(tier)
 
-        return num
+                for x in tier:
+                    beats_all[x] += w
+                    row = corrections[x]
+                    for y in above:
+                        row[y] -= w
+
+        self.__index = index
+        self.__pairwise = [
+            [beats_all[x] + corrections[x][y] for y in range(m)] for x in range(m)
+        ]
+
+        return self.__pairwise
+
+
+    def beats(self, quota):
+        """The pairwise relation for a quota: entry [i][j] is True if the
+        number of voters that prefer the i-th alternative (in sorted order)
+        over the j-th one reaches the quota.
+        """
+
+        return [[count >= quota for count in row] for row in self.pairwise()]
+
+
+    def num_voters(self):
+        """The (weighted) number of voters, i.e. the sum of the ballot weights.
+        This can be much larger than the number of unique ballots.
+        """
+
+        return sum(ballot.weight for ballot in self.ballots.values())
+
+
+    def quota_classes(self, quotas):
+        """Groups quotas that give the same relation (see `beats`).
+
+        `count >= q` only changes when q passes one of the distinct counts in
+        the pairwise matrix, so every quota q gives the same relation as the
+        smallest distinct count d >= q. All quotas above the highest count
+        give the empty relation.
+
+        Returns:
+            A list of classes in order of their first quota, each a list of
+            quotas (in the order they were given).
+        """
+
+        counts = sorted({count for row in self.pairwise() for count in row})
+        classes = {}
+
+        for quota in quotas:
+            index = bisect.bisect_left(counts, quota)
+            threshold = counts[index] if index < len(counts) else None
+            classes.setdefault(threshold, []).append(quota)
+
+        return list(classes.values())
 
 
     def dominance(self):
@@ -277,94 +503,179 @@ class Profile:
         Returns:
             An 𝑚×𝑚 matrix representing the dominance relation P
         """
-        sorted_alternatives = self.__sorted_alternatives()
 
-        dominance = [[self.num_prefers(y, x) for x in sorted_alternatives] for y in sorted_alternatives]
+        return [row[:] for row in self.pairwise()]
 
-        return dominance
 
+    def render(self, max_ballots = None) -> str:
+        """Render a profile as a string. This is what `print` writes.
 
-    def print(self):
-        """Pretty-print a profile
+        If `max_ballots` is given and the profile has more unique ballots than
+        that, only the `max_ballots` heaviest ballots are shown, followed by a
+        summary of the ones that were left out.
         """
 
-        maxlen = len(str(len(self.ballots)))
-        for ballot in self.ballots.values():
+        ballots = list(self.ballots.items())
+
+        maxlen = len(str(len(ballots)))
+        for _, ballot in ballots:
             length = len(str(ballot.weight))
             if length > maxlen:
                 maxlen = length
 
-        has_weights = max([ballot.weight for ballot in self.ballots.values()]) > 1
+        has_weights = max([ballot.weight for _, ballot in ballots]) > 1
 
-        print("Profile:\n")
-        for voter, ballot in self.ballots.items():
+        hidden = []
+        if max_ballots != None and len(ballots) > max_ballots:
             if has_weights:
-                print(f"\t#{ballot.weight:{maxlen}} │ ", end='')
-                for alternative in ballot.preference:
-                    print(alternative, end=' ')
-                print() # newline
-            else:
-                print(f"\t{voter:{maxlen}} │ ", end='')
-                for alternative in ballot.preference:
-                    print(alternative, end=' ')
-                print() # newline
-        print() # newline
+                # sorted is stable, so ballots with equal weights keep their order
+                ballots = sorted(ballots, key=lambda item: item[1].weight, reverse=True)
+            hidden = ballots[max_ballots:]
+            ballots = ballots[:max_ballots]
+
+        lines = ["Profile:\n"]
+        for voter, ballot in ballots:
+            label = f"#{ballot.weight:{maxlen}}" if has_weights else f"{voter:{maxlen}}"
+            preference = "".join(
+                f"{tier[0]} " if len(tier) == 1 else f"{{{' '.join(tier)}}} " for tier in ballot.tiers()
+            )
+            lines.append(f"\t{label} │ {preference}")
+
+        if len(hidden) > 0:
+            hidden_voters = sum(ballot.weight for _, ballot in hidden)
+            lines.append(f"\t… {len(hidden)} more ballots ({hidden_voters} voters)")
+        lines.append("")
 
         if self.alternatives_names != None:
-            print("IDs represent the following alternatives:\n")
+            lines.append("IDs represent the following alternatives:\n")
+
+            names = [f"{id:>2}: {name:30} " for id, name in self.alternatives_names.items()]
+            for row in range(0, len(names), 3):
+                lines.append("".join(names[row:row + 3]))
+            if len(names) % 3 == 0:
+                lines.append("")
 
-            brk = 0
-            for id, name in self.alternatives_names.items():
-                brk += 1
-                print(f"{id:>2}: {name:30}", end=' ')
-                if brk % 3 == 0:
-                    print()
-            print()
+        return "\n".join(lines) + "\n"
 
 
-    def print_dominance(self):
-        """Pretty-print a dominance matrix
+    def print(self, file = None, max_ballots = None):
+        """Pretty-print a profile to `file`, or to stdout if no file is given.
+        See `render` for `max_ballots`.
+        """
+
+        if file == None:
+            file = sys.stdout
+
+        file.write(self.render(max_ballots))
+
+
+    def render_dominance(self) -> str:
+        """Render the dominance matrix as a string. This is what
+        `print_dominance` writes.
         """
 
         dominance = self.dominance()
+        names = [self.alternative_name(x) for x in self.__sorted_alternatives()]
 
-        maxlen = len(str(max(max(dominance))))
-        for x in self.__sorted_alternatives():
-            name = self.alternative_name(x)
+        maxlen = len(str(max(max(row) for row in dominance)))
+        for name in names:
             if len(name) > maxlen:
                 maxlen = len(name)
 
-        # Print header
-        print("Dominance matrix:\n")
-        print("\t", end='')
-        for _ in range(maxlen):
-            print(" ", end='')
-        print(" │ ", end='')
-        for x in self.__sorted_alternatives():
-            name = self.alternative_name(x)
-            print(f"{name:^{maxlen + 1}}", end='')
-        print() # newline
-
-        # Print separating line
-        print("\t", end='')
-        for _ in range(maxlen + 1):
-            print("─", end='')
-        print("┼", end='')
-        for _ in range(len(self.alternatives) * (maxlen + 1)):
-            print("─", end='')
-        print()
-
-        # Print rows
-        for i, x in enumerate(self.__sorted_alternatives()):
-            name = self.alternative_name(x)
-            print(f"\t{name:{maxlen}} │ ", end = '')
-            for j, _ in enumerate(self.__sorted_alternatives()):
-                print(f"{str(dominance[i][j]):^{maxlen + 1}}", end='')
-            print() # newline
-        print() # newline
+        lines = ["Dominance matrix:\n"]
+
+        # Header
+        header = "".join(f"{name:^{maxlen + 1}}" for name in names)
+        lines.append(f"\t{' ' * maxlen} │ {header}")
+
+        # Separating line
+        lines.append(f"\t{'─' * (maxlen + 1)}┼{'─' * (len(names) * (maxlen + 1))}")
+
+        # Rows
+        for name, row in zip(names, dominance):
+            cells = "".join(f"{str(value):^{maxlen + 1}}" for value in row)
+            lines.append(f"\t{name:{maxlen}} │ {cells}")
+
+        return "\n".join(lines) + "\n\n"
+
+
+    def print_dominance(self, file = None):
+        """Pretty-print a dominance matrix to `file`, or to stdout if no file
+        is given.
+        """
+
+        if file == None:
+            file = sys.stdout
+
+        file.write(self.render_dominance())
+
+
+    def to_dict(self, dominance = True) -> dict:
+        """A JSON-serialisable representation of the profile, optionally
+        including the dominance matrix (rows and columns in sorted order).
+        """
+
+        data = {
+            "alternatives": self.__sorted_alternatives(),
+            "names": self.alternatives_names,
+            "ballots": [
+                {"id": voter, "weight": ballot.weight, "preference": list(ballot.preference)}
+                for voter, ballot in self.ballots.items()
+            ],
+            "complete": self.is_complete(),
+        }
 
+        for ballot, voter in zip(data["ballots"], self.ballots.values()):
+            if voter.groups != None:
+                ballot["groups"] = list(voter.groups)
 
-    def winner(self, rule: Rule):
+        if dominance:
+            data["dominance"] = self.dominance()
+
+        return data
+
+
+    def export_json(self, file, dominance = True):
+        """Write the profile (and dominance matrix) as JSON to a file object.
+        """
+
+        json.dump(self.to_dict(dominance), file)
+
+
+    def export_csv(self, file):
+        """Write the profile as CSV to a file object, one row per ballot:
+        voter id, weight, followed by the preference. Tied alternatives share
+        a cell, written as `{b c}` like in `render`. Unranked alternatives of
+        incomplete (`.soi`) ballots are left out.
+        """
+
+        writer = csv.writer(file)
+        writer.writerow(["id", "weight", "preference"])
+        writer.writerows(
+            [voter, ballot.weight,
+             *(tier[0] if len(tier) == 1 else f"{{{' '.join(tier)}}}" for tier in ballot.tiers())]
+            for voter, ballot in self.ballots.items()
+        )
+
+
+    def export_dominance_csv(self, file):
+        """Write the dominance matrix as CSV to a file object, with the
+        alternatives as row and column headers.
+        """
+
+        sorted_alternatives = self.__sorted_alternatives()
+
+        writer = csv.writer(file)
+        writer.writerow([""] + sorted_alternatives)
+        writer.writerows(
+            [x] + row for x, row in zip(sorted_alternatives, self.dominance())
+        )
+
+
+    def winner(self, rule: Rule, scoring = None):
+        """The winner according to `rule`. The positional rule also needs a
+        scoring vector, e.g. [2, 1, 0].
+        """
         if rule == Rule.PLURALITY:
             return self.__winner_plurality()
         elif rule == Rule.BORDA:
@@ -373,6 +684,92 @@ class Profile:
             return self.__winner_condorcet()
         elif rule == Rule.WEAK_CONDORCET:
             return self.__winner_weak_condorcet()
+        elif rule == Rule.POSITIONAL:
+            if scoring == None:
+                raise ValueError("The positional rule needs a scoring vector.")
+            return self.__best(self.positional_scores([scoring])[0])
+        elif rule == Rule.COPELAND:
+            return self.__winner_copeland()
+        elif rule == Rule.MAXIMIN:
+            return self.__winner_maximin()
+        elif rule == Rule.KEMENY:
+            return self.__winner_kemeny()
+
+
+    def __best(self, scores):
+        """The alternative with the highest score, with alphabetic
+        tie-breaking.
+        """
+        best = max(scores.values())
+        # Scores from tied ballots are fractions, which can differ by rounding
+        # errors alone, so those count as ties too
+        tolerance = 1e-9 * max(1, abs(best))
+
+        return sorted(str(x) for x, score in scores.items() if score >= best - tolerance)[0]
+
+
+    def positions(self):
+        """The position matrix: entry [i][k] is the (weighted) number of voters
+        that put the i-th alternative (in sorted order) in position k. Tied
+        alternatives share the positions of their class equally. Calculated
+        once and cached.
+        """
+
+        if self.__positions != None:
+            return self.__positions
+
+        sorted_alternatives = self.__sorted_alternatives()
+        index = {x: i for i, x in enumerate(sorted_alternatives)}
+        m = len(sorted_alternatives)
+
+        positions = [[0] * m for _ in range(m)]
+
+        for ballot in self.ballots.values():
+            position = 0
+            for tier in ballot.tiers():
+                share = ballot.weight / len(tier) if len(tier) > 1 else ballot.weight
+                for x in tier:
+                    row = positions[index[x]]
+                    for k in range(position, position + len(tier)):
+                        row[k] += share
+                position += len(tier)
+
+        self.__positions = positions
+
+        return positions
+
+
+    def positional_scores(self, vectors):
+        """The scores of all alternatives for several positional scoring
+        vectors at once, e.g. `[[1], [2, 1, 0]]` for plurality and Borda with
+        three alternatives. Vectors shorter than the number of alternatives
+        are padded with zeros.
+
+        The ballots are only traversed once (see `positions`), after which
+        every vector costs 𝑚² steps.
+
+        Returns:
+            A list with, for every vector, a dictionary of scores.
+        """
+
+        m = len(self.alternatives)
+        positions = self.positions()
+        sorted_alternatives = self.__sorted_alternatives()
+
+        scores = []
+
+        for vector in vectors:
+            if len(vector) > m:
+                raise ValueError(f"The scoring vector {vector} is longer than the number "
+                                 f"of alternatives ({m}).")
+            vector = list(vector) + [0] * (m - len(vector))
+
+            scores.append({
+                x: sum(count * score for count, score in zip(positions[i], vector))
+                for i, x in enumerate(sorted_alternatives)
+            })
+
+        return scores
 
 
     def __winner_plurality(self):
@@ -385,10 +782,16 @@ class Profile:
 
         # Calculate plurality scores by traversing all ballots
         for ballot in self.ballots.values():
-            # the top choice for the current ballot
-            voter_max = ballot.preference[0]
+            if len(ballot.preference) == 0:
+                continue
 
-            plur_score[voter_max] += ballot.weight
+            # the top choice(s) for the current ballot. If several alternatives
+            # are tied at the top, they share the ballot's weight. The shares
+            # are kept as exact fractions, so ties are still detected exactly
+            voter_max = ballot.tiers()[0]
+
+            for alternative in voter_max:
+                plur_score[alternative] += Fraction(ballot.weight) / len(voter_max)
 
         (winner_id, winner_score) = plur_score.popitem()
 
@@ -405,21 +808,100 @@ class Profile:
 
 
     def __winner_borda(self):
-        m = len(self.alternatives)
+        """Borda, calculated as the number of times an alternative beats
+        another one. For complete strict orders this is the usual
+        𝑚 - 1, 𝑚 - 2, …, 0 scoring; for incomplete orders and ties it only
+        counts the alternatives that are actually ranked below.
+        """
         borda_score = dict.fromkeys(self.alternatives, 0)
+        pairwise = self.pairwise()
 
-        for ballot in self.ballots.values():
-            for index, alternative in enumerate(ballot.preference):
-                # calculate weight
-                w = m - index - 1
-                # update borda score
-                borda_score[alternative] += w
+        for index, alternative in enumerate(self.__sorted_alternatives()):
+            borda_score[alternative] = sum(pairwise[index])
 
         outcome = max(borda_score, key = borda_score.get)
 
         return outcome
     
 
+    def __winner_copeland(self):
+        """Copeland: the number of pairwise majority wins minus the number of
+        losses, with alphabetic tie-breaking.
+        """
+        pairwise = self.pairwise()
+        m = len(pairwise)
+
+        scores = {}
+        for i, x in enumerate(self.__sorted_alternatives()):
+            wins = sum(1 for j in range(m) if pairwise[i][j] > pairwise[j][i])
+            losses = sum(1 for j in range(m) if pairwise[i][j] < pairwise[j][i])
+            scores[x] = wins - losses
+
+        return self.__best(scores)
+
+
+    def __winner_maximin(self):
+        """Maximin: the alternative whose worst pairwise comparison is the
+        best, with alphabetic tie-breaking.
+        """
+        pairwise = self.pairwise()
+
+        scores = {}
+        for i, x in enumerate(self.__sorted_alternatives()):
+            scores[x] = min(count for j, count in enumerate(pairwise[i]) if j != i)
+
+        return self.__best(scores)
+
+
+    def __winner_kemeny(self):
+        """The top alternative of a Kemeny ranking, i.e. a ranking that agrees
+        with as many (weighted) pairwise preferences as possible. If there are
+        several such rankings, the alphabetically first top alternative wins.
+
+        Instead of trying all 𝑚! rankings, this uses dynamic programming over
+        subsets of alternatives: the best ranking of a set S starts with some
+        a in S, followed by the best ranking of S without a, and putting a on
+        top agrees with the preferences of a over everything in S without a.
+        With the agreement of every alternative over every subset tabulated,
+        this takes O(2^𝑚·𝑚) steps.
+        """
+        pairwise = self.pairwise()
+        m = len(pairwise)
+        full = (1 << m) - 1
+
+        # gain[a][S]: number of preferences of a over the alternatives in S
+        gain = []
+        for a in range(m):
+            row = [0] * (full + 1)
+            for subset in range(1, full + 1):
+                lowest = subset & -subset
+                row[subset] = row[subset ^ lowest] + pairwise[a][lowest.bit_length() - 1]
+            gain.append(row)
+
+        # best[S]: the highest agreement of any ranking of the alternatives in S
+        best = [0] * (full + 1)
+        for subset in range(1, full + 1):
+            value = 0
+            rest = subset
+            while rest:
+                lowest = rest & -rest
+                rest ^= lowest
+                without = subset ^ lowest
+                candidate = gain[lowest.bit_length() - 1][without] + best[without]
+                if candidate > value:
+                    value = candidate
+            best[subset] = value
+
+        # the alternatives that can be on top of an optimal ranking; the
+        # indices follow the sorted alternatives, so the lowest one comes first
+        # alphabetically
+        sorted_alternatives = self.__sorted_alternatives()
+        for a in range(m):
+            without = full ^ (1 << a)
+            if gain[a][without] + best[without] == best[full]:
+                return sorted_alternatives[a]
+
+
     def __winner_condorcet(self):
         raise NotImplementedError()
 
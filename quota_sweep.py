@@ -3,11 +3,15 @@ import random
 import os
 import math
 import argparse
-import sys
+import shutil
+import time
 from profile import Profile
 from game import Game
 from gametype import GameType
 from analysis import Analysis
+from cache import OutcomeCache
+from store import ResultsStore
+from shard import Coordinator, parse_address
 from rule import Rule
 from enum import Enum
 from pathlib import Path
@@ -15,8 +19,19 @@ from pathlib import Path
 
 def main(args):
 
-    if args.n_alternatives > 10:
-        print("This won't work")
+    if args.clear_cache:
+        OutcomeCache(args.cache_path).clear()
+
+    cache = OutcomeCache(args.cache_path) if args.cache else None
+
+    coordinator = None
+    if args.coordinator != None:
+        coordinator = Coordinator(*args.coordinator, timeout=args.worker_timeout)
+        host, port = coordinator.address
+        print(f"Waiting for workers on {host}:{port} (start them with `python shard.py {host}:{port}`)")
+
+    if args.n_alternatives > 10 and args.coordinator == None:
+        print("This won't work without workers, see --coordinator")
         exit()
 
     if args.random_profile:
@@ -33,17 +48,58 @@ def main(args):
             print(f"Found a file with {args.n_alternatives} alternatives: {filename}")
 
         results = {}
-        expected = prof.winner(args.rule)
-        n_voters = len(prof.ballots)
-        
-        for q in [i + 1 for i in range(n_voters)]:
-            analysis = Analysis(args.procedure, prof, q, expected)
+        rows = []
+        expected = prof.winner(args.rule, args.scoring)
+        n_voters = prof.num_voters()
+        quotas = [i + 1 for i in range(n_voters)]
+
+        if args.quota_classes:
+            # Quotas that give the same relation have the same outcomes, so
+            # only the first quota of every class is analysed
+            classes = prof.quota_classes(quotas)
+            print(f"{len(quotas)} quotas give {len(classes)} different relations")
+        else:
+            classes = [[q] for q in quotas]
+
+        name = "generated" if args.random_profile else filename
+
+        for quota_class in classes:
+            q = quota_class[0]
+
+            table_path = None
+            if args.table_directory != None:
+                os.makedirs(args.table_directory, exist_ok=True)
+                table_path = os.path.join(args.table_directory, f"{name}-{args.procedure}-q{q}.outcomes")
+
+            analysis = Analysis(args.procedure, prof, q, expected, cache, coordinator, table_path)
+
+            start = time.perf_counter()
+            percentage, outcome = analysis.outcomes()
+            seconds = (time.perf_counter() - start) / len(quota_class)
+
+            if table_path != None:
+                # The other quotas in the class have the same table
+                for quota in quota_class[1:]:
+                    link_table(table_path, os.path.join(args.table_directory,
+                                                        f"{name}-{args.procedure}-q{quota}.outcomes"))
 
-            percentage, _ = analysis.outcomes()
-            results[q] = percentage
+            for quota in quota_class:
+                results[quota] = percentage
+                rows.append(ResultsStore.row("quota_sweep", name,
+                                             args.random_profile, args.rule, args.scoring, args.procedure,
+                                             args.n_alternatives, quota, percentage, outcome,
+                                             analysis.num_agendas, seconds))
+
+        if coordinator != None:
+            coordinator.close()
 
         os.makedirs(args.output_directory, exist_ok=True)
 
+        store = ResultsStore(args.results_store or os.path.join(args.output_directory, ResultsStore.DEFAULT_NAME))
+        store.replace("quota_sweep", args.rule, args.scoring, args.procedure, args.n_alternatives,
+                      args.random_profile, rows)
+        store.close()
+
         if args.random_profile:
             is_random = "-random"
         else:
@@ -54,14 +110,10 @@ def main(args):
             f"q-{str(args.rule)}-{str(args.procedure)}-{args.n_alternatives}{is_random}.log",
         )
 
-        original_stdout = sys.stdout
-
         with open(output_filename, "w") as output_file:
             if args.random_profile:
                 # print profile to file
-                sys.stdout = output_file
-                profile.print()
-                sys.stdout = original_stdout
+                prof.print(file=output_file)
             
             writer = csv.writer(output_file)
             
@@ -74,16 +126,30 @@ def main(args):
                 writer.writerow([quota, percentage])
 
 
+def link_table(source, path):
+    """Makes the outcome table at `source` available at `path` as well, as a
+    hard link if the file system supports it and as a copy otherwise.
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    try:
+        os.link(source, path)
+    except OSError:
+        shutil.copyfile(source, path)
+
+
 def find_profile(dir, alternatives):
     """Tries to find a profile with a given number of alternatives
     """
 
     for file in os.scandir(dir):
-        if file.path.endswith(".soc"):
+        if file.path.endswith((".soc", ".soi", ".toc")):
             with open(file) as cur_file:
                 num_alternatives = int(cur_file.readline())
                 if num_alternatives == alternatives:
-                    return Path(file.name).stem, Profile.from_soc(file.path)
+                    return Path(file.name).stem, Profile.from_file(file.path)
 
     return None
 
@@ -98,7 +164,7 @@ if __name__ == "__main__":
         type=Rule.argparse,
         default="plurality",
         choices=list(Rule),
-        help="Which rule to compare to. Note that only plurality and borda are implemented currently.",
+        help="Which rule to compare to. Note that condorcet and weak_condorcet are not implemented currently.",
     )
     parser.add_argument(
         "-p",
@@ -108,11 +174,19 @@ if __name__ == "__main__":
         choices=list(GameType),
         help="Which procedure to use",
     )
+    parser.add_argument(
+        "-s",
+        "--scoring",
+        type=float,
+        nargs="+",
+        default=None,
+        help="The scoring vector for the positional rule, e.g. -s 2 1 0. Missing positions score 0",
+    )
     parser.add_argument(
         "-i",
         "--input_directory",
         type=str,
-        help="An input directory containing .soc files",
+        help="An input directory containing .soc, .soi or .toc files",
     )
     parser.add_argument(
         "-m",
@@ -128,6 +202,55 @@ if __name__ == "__main__":
         default="./logs/",
         help="The directory to save output files to. Will be created if it doesn't exist already",
     )
+    parser.add_argument(
+        "--results_store",
+        type=str,
+        default=None,
+        help="The database to save results to (default: results.sqlite in the output directory). See store.py",
+    )
+    parser.add_argument(
+        "-t",
+        "--table_directory",
+        type=str,
+        default=None,
+        help="If given, write the winner of every agenda to an outcome table in this directory (see outcome_table.py). All agendas are tested, regardless of the number of alternatives",
+    )
+    parser.add_argument(
+        "--cache",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+        help="Whether to reuse outcomes calculated in earlier runs, and save new ones",
+    )
+    parser.add_argument(
+        "--cache_path",
+        type=str,
+        default=OutcomeCache.DEFAULT_PATH,
+        help="The file to keep cached outcomes in",
+    )
+    parser.add_argument(
+        "--clear_cache",
+        default=False,
+        action="store_true",
+        help="Remove all cached outcomes before starting",
+    )
+    parser.add_argument(
+        "--quota_classes",
+        default=True,
+        action=argparse.BooleanOptionalAction,
+        help="Only analyse one quota per distinct pairwise relation and copy its results to the other quotas",
+    )
+    parser.add_argument(
+        "--coordinator",
+        type=parse_address,
+        default=None,
+        help="Enumerate all agendas exactly on workers connecting to this address (host:port), see shard.py",
+    )
+    parser.add_argument(
+        "--worker_timeout",
+        type=float,
+        default=Coordinator.DEFAULT_TIMEOUT,
+        help="How many seconds a worker gets per range before the range is handed to another worker",
+    )
     parser.add_argument(
         "-x",
         "--random_profile",
@@ -138,4 +261,7 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
 
+    if args.rule == Rule.POSITIONAL and args.scoring == None:
+        parser.error("the positional rule needs a scoring vector (--scoring)")
+
     main(args)
\ No newline at end of file
@@ -4,7 +4,11 @@ class Rule(Enum):
     PLURALITY = 1,
     BORDA = 2,
     CONDORCET = 3,
-    WEAK_CONDORCET = 4
+    WEAK_CONDORCET = 4,
+    POSITIONAL = 5,
+    COPELAND = 6,
+    MAXIMIN = 7,
+    KEMENY = 8
 
 
     # magic methods for argparse compatibility
@@ -0,0 +1,268 @@
+import argparse
+import json
+import math
+import socket
+import threading
+import time
+from collections import deque
+import agenda
+from gametype import GameType
+from profile import Profile
+
+
+def send(stream, message):
+    """Send a message as a single line of JSON.
+    """
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
+
+
+def receive(stream):
+    """Receive a message sent with `send`, or None if the connection was
+    closed.
+    """
+    line = stream.readline()
+
+    if line == b"":
+        return None
+
+    return json.loads(line)
+
+
+def evaluate_range(type, profile, quota, start, stop):
+    """Count the winners of the agendas with lexicographic ranks `start` up to
+    `stop`, where the ranks are taken over the sorted alternatives. Every
+    agenda is evaluated on the thresholded relation with `agenda.evaluate`.
+    """
+
+    alternatives = sorted(profile.alternatives)
+    beats = profile.beats(quota)
+    counts = [0] * len(alternatives)
+
+    # Ranks over the indices are the same as over the sorted alternatives
+    for permutation in agenda.permutations(range(len(alternatives)), start, stop):
+        counts[agenda.evaluate(type, beats, permutation)] += 1
+
+    return dict(zip(alternatives, counts))
+
+
+class Job:
+    """The state of a single distributed analysis: the ranges that still have
+    to be handed out, the ones that are done and the merged winner counts.
+    """
+
+    def __init__(self, type, profile, quota, chunk_size):
+        self.type = type
+        self.profile = profile
+        self.quota = quota
+        self.digest = profile.digest()
+
+        total = math.factorial(len(profile.alternatives))
+        self.pending = deque((start, min(start + chunk_size, total))
+                             for start in range(0, total, chunk_size))
+        self.num_ranges = len(self.pending)
+        self.done = set()
+        self.counts = dict.fromkeys(profile.alternatives, 0)
+
+    def finished(self):
+        return len(self.done) == self.num_ranges
+
+
+class Coordinator:
+    """Distributes the exact enumeration of all agendas over worker processes
+    that connect over TCP (see `run_worker`).
+
+    The agenda space, i.e. all permutations of the alternatives, is split into
+    ranges of permutation ranks. Workers receive every profile once, pull
+    ranges and send back the number of times every alternative won. If a
+    worker disconnects or doesn't respond within `timeout` seconds, the range
+    it was working on is handed to another worker. Every range is counted
+    exactly once, so the merged counts are the same as those of a single-node
+    run.
+
+    Workers stay connected between jobs, so a single coordinator can be used
+    for a whole experiment.
+    """
+
+    # Seconds a worker gets to return a range. Without a timeout, a worker
+    # whose machine stops answering would keep its range forever.
+    DEFAULT_TIMEOUT = 300
+
+    def __init__(self, host="localhost", port=0, chunk_size=5000, timeout=DEFAULT_TIMEOUT):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+
+        self.job = None
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()[:2]
+
+        threading.Thread(target=self.__accept, daemon=True).start()
+
+    def __accept(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                # The server socket was closed
+                return
+
+            connection.settimeout(self.timeout)
+            threading.Thread(target=self.__serve, args=(connection,), daemon=True).start()
+
+    def __serve(self, connection):
+        """Hands out ranges to a single worker until the coordinator closes or
+        the worker goes away.
+        """
+
+        stream = connection.makefile("rwb")
+        # Digests of the profiles this worker already received
+        known = set()
+
+        try:
+            while True:
+                with self.condition:
+                    while not self.closed and (self.job == None or len(self.job.pending) == 0):
+                        self.condition.wait()
+
+                    if self.closed:
+                        send(stream, {"type": "shutdown"})
+                        return
+
+                    job = self.job
+                    start, stop = job.pending.popleft()
+
+                try:
+                    if job.digest not in known:
+                        send(stream, {"type": "profile", "digest": job.digest,
+                                      "profile": job.profile.to_dict(dominance=False)})
+                        known.add(job.digest)
+
+                    send(stream, {"type": "range", "digest": job.digest, "game_type": str(job.type),
+                                  "quota": job.quota, "start": start, "stop": stop})
+                    result = receive(stream)
+
+                    if (not isinstance(result, dict) or result.get("start") != start
+                            or result.get("stop") != stop):
+                        raise ConnectionError("Worker did not return a result")
+
+                    # Check the counts before merging them, so a bad result
+                    # doesn't leave the range marked as done
+                    counts = result.get("counts")
+                    if (not isinstance(counts, dict)
+                            or not all(alternative in job.counts and isinstance(count, int) and count >= 0
+                                       for alternative, count in counts.items())
+                            or sum(counts.values()) != stop - start):
+                        raise ValueError("Worker returned invalid counts")
+                except (OSError, ValueError):
+                    # Dead or misbehaving worker: give the range to someone else
+                    with self.condition:
+                        job.pending.appendleft((start, stop))
+                        self.condition.notify_all()
+                    return
+
+                with self.condition:
+                    if (start, stop) not in job.done:
+                        job.done.add((start, stop))
+                        for alternative, count in counts.items():
+                            job.counts[alternative] += count
+
+                    if job.finished():
+                        self.condition.notify_all()
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+    def histogram(self, type, profile, quota):
+        """The number of agendas for which every alternative wins, over all
+        permutations of the alternatives. Blocks until all ranges are done.
+        """
+
+        job = Job(type, profile, quota, self.chunk_size)
+
+        with self.condition:
+            self.job = job
+            self.condition.notify_all()
+
+            while not job.finished():
+                self.condition.wait()
+
+            self.job = None
+
+        return job.counts
+
+    def close(self):
+        """Stop accepting workers and tell the connected ones to shut down.
+        """
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        self.server.close()
+
+
+def run_worker(host, port):
+    """Connect to a coordinator and evaluate the ranges it sends until it
+    shuts down.
+    """
+
+    with socket.create_connection((host, port)) as connection:
+        stream = connection.makefile("rwb")
+        profiles = {}
+
+        while True:
+            message = receive(stream)
+
+            if message == None or message["type"] == "shutdown":
+                return
+
+            if message["type"] == "profile":
+                profiles[message["digest"]] = Profile.from_dict(message["profile"])
+            elif message["type"] == "range":
+                counts = evaluate_range(GameType.argparse(message["game_type"]),
+                                        profiles[message["digest"]], message["quota"],
+                                        message["start"], message["stop"])
+                send(stream, {"type": "result", "start": message["start"],
+                              "stop": message["stop"], "counts": counts})
+
+
+def parse_address(s):
+    """Parses a `host:port` string, for argparse.
+    """
+    host, _, port = s.rpartition(":")
+    return host or "localhost", int(port)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run a worker for a coordinator started with the --coordinator option of main.py or quota_sweep.py",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "address",
+        type=parse_address,
+        help="The address of the coordinator, as host:port",
+    )
+    parser.add_argument(
+        "--retry",
+        type=float,
+        default=60,
+        help="How many seconds to keep trying to connect if the coordinator isn't up yet",
+    )
+
+    args = parser.parse_args()
+
+    deadline = time.time() + args.retry
+
+    while True:
+        try:
+            run_worker(*args.address)
+            break
+        except ConnectionRefusedError:
+            if time.time() > deadline:
+                raise
+            time.sleep(1)
@@ -0,0 +1,201 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+
+
+class ResultsStore:
+    """Keeps the results of the experiments in a single SQLite database, with
+    one row per analysed (profile, rule, procedure, m, quota), instead of in
+    separate log files per configuration.
+
+    The summaries in the `results` folder can be regenerated from the database
+    with `export_quota_sweeps` and `export_analysis`, or by running
+    `python store.py <database>`.
+    """
+
+    DEFAULT_NAME = "results.sqlite"
+
+    COLUMNS = ["experiment", "profile", "random", "rule", "scoring", "procedure", "m", "quota",
+               "percentage", "outcomes", "agendas", "seconds", "created"]
+
+    def __init__(self, path):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "experiment TEXT NOT NULL, "  # 'analysis' or 'quota_sweep'
+                "profile TEXT NOT NULL, "     # file name, or generated-<i>
+                "random INTEGER NOT NULL, "   # whether the profile was generated
+                "rule TEXT NOT NULL, "
+                "scoring TEXT, "              # scoring vector of the positional rule
+                "procedure TEXT NOT NULL, "
+                "m INTEGER NOT NULL, "
+                "quota REAL NOT NULL, "
+                "percentage REAL NOT NULL, "  # how often the rule's winner won
+                "outcomes TEXT NOT NULL, "    # JSON list of possible winners
+                "agendas INTEGER NOT NULL, "  # number of agendas tested
+                "seconds REAL NOT NULL, "
+                "created REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_configuration "
+                "ON results (experiment, rule, procedure, m, random)"
+            )
+
+
+    @staticmethod
+    def row(experiment, profile, random, rule, scoring, procedure, m, quota, percentage, outcomes,
+            agendas, seconds):
+        """A single result, in the format `replace` expects.
+        """
+
+        return (experiment, profile, int(random), str(rule),
+                encode_scoring(scoring), str(procedure), m, quota,
+                percentage, json.dumps(outcomes), agendas, seconds, time.time())
+
+
+    def replace(self, experiment, rule, scoring, procedure, m, random, rows):
+        """Replaces the results of a configuration by new ones in a single
+        transaction. This mirrors how rerunning an experiment used to overwrite
+        its log file. Runs of the positional rule with different scoring
+        vectors are different configurations.
+        """
+
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM results WHERE experiment = ? AND rule = ? AND scoring IS ? "
+                "AND procedure = ? AND m = ? AND random = ?",
+                (experiment, str(rule), encode_scoring(scoring), str(procedure), m, int(random)),
+            )
+            self.connection.executemany(
+                f"INSERT INTO results ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                rows,
+            )
+
+
+    def export_quota_sweeps(self, directory, random=True):
+        """Writes the quota sweep summaries, one `<rule>-<procedure>.csv` per
+        configuration (`<rule>-<scoring>-<procedure>.csv` for runs with a
+        scoring vector, e.g. `positional-2_1_0-successive.csv`), with a row
+        per quota and a column per number of alternatives.
+        """
+
+        rows = self.connection.execute(
+            "SELECT rule, scoring, procedure, quota, m, AVG(percentage) FROM results "
+            "WHERE experiment = 'quota_sweep' AND random = ? "
+            "GROUP BY rule, scoring, procedure, quota, m ORDER BY rule, scoring, procedure, quota, m",
+            (int(random),),
+        ).fetchall()
+
+        tables = {}
+        for rule, scoring, procedure, quota, m, percentage in rows:
+            tables.setdefault((rule, scoring, procedure), {}).setdefault(quota, {})[m] = percentage
+
+        os.makedirs(directory, exist_ok=True)
+
+        for (rule, scoring, procedure), table in tables.items():
+            ms = sorted({m for row in table.values() for m in row})
+            name = rule if scoring == None else f"{rule}-{format_scoring(scoring, '_')}"
+
+            with open(os.path.join(directory, f"{name}-{procedure}.csv"), "w", newline="") as output_file:
+                writer = csv.writer(output_file)
+                writer.writerow(["q"] + [f"m={m}" for m in ms])
+                for quota, row in table.items():
+                    writer.writerow([format_quota(quota)] + [row.get(m, "") for m in ms])
+
+        return list(tables)
+
+
+    def export_analysis(self, file, random):
+        """Writes the average percentage per number of alternatives for every
+        procedure and rule, as in `random-analysis.csv` (random profiles) or
+        `real-life-analysis.csv`. Runs with a scoring vector get their own
+        column, e.g. `successive_positional[2,1,0]`.
+        """
+
+        rows = self.connection.execute(
+            "SELECT m, procedure, rule, scoring, AVG(percentage) FROM results "
+            "WHERE experiment = 'analysis' AND random = ? "
+            "GROUP BY m, procedure, rule, scoring ORDER BY m, procedure, rule, scoring",
+            (int(random),),
+        ).fetchall()
+
+        table = {}
+        for m, procedure, rule, scoring, percentage in rows:
+            column = f"{procedure}_{rule}" if scoring == None else f"{procedure}_{rule}[{format_scoring(scoring, ',')}]"
+            table.setdefault(m, {})[column] = percentage
+
+        columns = sorted({column for row in table.values() for column in row})
+
+        writer = csv.writer(file)
+        writer.writerow(["m"] + columns)
+        for m, row in table.items():
+            writer.writerow([m] + [row.get(column, "") for column in columns])
+
+
+    def close(self):
+        self.connection.close()
+
+
+def encode_scoring(scoring):
+    """Scoring vectors are stored as JSON, or NULL if there is none.
+    """
+    return json.dumps(scoring) if scoring != None else None
+
+
+def format_scoring(scoring, separator):
+    """A stored scoring vector as a short string, e.g. `2_1_0`.
+    """
+    return separator.join(str(format_quota(score)) for score in json.loads(scoring))
+
+
+def format_quota(quota):
+    """Quotas are stored as floats, but are usually whole numbers.
+    """
+    return int(quota) if float(quota).is_integer() else quota
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Regenerate the CSV summaries from a results database",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument(
+        "database",
+        type=str,
+        help="The results database written by main.py and quota_sweep.py",
+    )
+    parser.add_argument(
+        "-o",
+        "--output_directory",
+        type=str,
+        default="./results/",
+        help="The directory to write the summaries to",
+    )
+
+    args = parser.parse_args()
+
+    store = ResultsStore(args.database)
+
+    sweeps = store.export_quota_sweeps(os.path.join(args.output_directory, "quota_sweeps"))
+    print(f"Wrote {len(sweeps)} quota sweep summaries")
+
+    for random, path in [(True, "random_analysis/random-analysis.csv"),
+                         (False, "real_life_analysis/real-life-analysis.csv")]:
+        path = os.path.join(args.output_directory, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", newline="") as output_file:
+            store.export_analysis(output_file, random)
+        print(f"Wrote {path}")
+
+    store.close()